@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from src.config import config
+from src.dlp_engine import DLPEngine
+
+
+def make_document(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = f"word{rng.randint(0, 10**6)} lorem ipsum dolor sit amet."
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def run(mode, args):
+    """One ML worker, caching and the prefilter off so every text reaches the
+    queue: a large document arrives first (split into ml_chunk_size chunks as
+    usual), then short messages at a fixed interval. Returns the latencies
+    (seconds) of both kinds."""
+    with patch.multiple(
+        config.dlp,
+        ml_scheduling=mode,
+        ml_workers_min=1,
+        ml_workers_max=1,
+        cache_max_entries=0,
+        ml_prefilter=False,
+    ):
+        engine = DLPEngine()
+    engine.start_workers()
+    await engine.redact("warm up, call 415-555-0199")
+
+    rng = random.Random(args.seed)
+    latencies = {"small": [], "large": []}
+
+    async def timed(kind, text):
+        started = time.perf_counter()
+        await engine.redact(text)
+        latencies[kind].append(time.perf_counter() - started)
+
+    tasks = [asyncio.create_task(timed("large", make_document(rng, args.large_size)))]
+    for i in range(args.messages):
+        text = f"msg {i} {rng.random()}: my phone is 415-555-0199, thanks"
+        tasks.append(asyncio.create_task(timed("small", text)))
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(*tasks)
+    engine.shutdown()
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare ml_scheduling modes on a mixed-size workload, "
+        "calling the engine directly (no proxy, no HTTP)"
+    )
+    parser.add_argument("--large-size", type=int, default=200_000)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(
+        f"  {'mode':<6} {'small p50':>10} {'small p99':>10} {'large':>10}"  # noqa: E231
+    )
+    for mode in ("fifo", "sjf"):
+        latencies = asyncio.run(run(mode, args))
+        small = latencies["small"]
+        print(
+            f"  {mode:<6} {statistics.median(small) * 1000:8.0f}ms "  # noqa: E231
+            f"{percentile(small, 0.99) * 1000:8.0f}ms "  # noqa: E231
+            f"{latencies['large'][0] * 1000:8.0f}ms"  # noqa: E231
+        )
@@ -0,0 +1,74 @@
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+from src.matchers import MarisaMatcher, build_matcher, compile_term_index
+
+
+def random_word(rng, min_len=6, max_len=14):
+    return "".join(
+        rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(min_len, max_len))
+    )
+
+
+def make_input(rng, terms, size_bytes, hit_rate):
+    words = []
+    length = 0
+    while length < size_bytes:
+        word = rng.choice(terms) if rng.random() < hit_rate else random_word(rng, 2, 10)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def bench(backend, terms, text, repeat):
+    start = time.perf_counter()
+    matcher = build_matcher(backend, terms)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hits = matcher.find(text)
+    scan = (time.perf_counter() - start) / repeat
+    return build, scan, len(hits)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare static term matcher backends on large term lists and inputs"
+    )
+    parser.add_argument("--terms", type=int, default=100_000)
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--hit-rate", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    terms = list({random_word(rng) for _ in range(args.terms)})
+    text = make_input(rng, terms, int(args.size_mb * 1024 * 1024), args.hit_rate)
+
+    print(f"{len(terms)} terms, {len(text) / 1024 / 1024:.1f} MB input")  # noqa: E231
+    for backend in ("flashtext", "aho_corasick", "marisa"):
+        build, scan, hits = bench(backend, terms, text, args.repeat)
+        throughput = len(text) / scan / 1024 / 1024
+        print(
+            f"  {backend:<13} build {build:6.2f}s  scan {scan * 1000:8.1f}ms  "  # noqa: E231
+            f"{throughput:7.1f} MB/s  {hits} hits"  # noqa: E231
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "terms.idx")
+        start = time.perf_counter()
+        compile_term_index(terms, path)
+        compiled = time.perf_counter() - start
+        start = time.perf_counter()
+        MarisaMatcher.load(path)
+        loaded = time.perf_counter() - start
+        print(
+            f"  compiled index {os.path.getsize(path) / 1024 / 1024:.1f} MB in {compiled:.2f}s, "  # noqa: E231
+            f"mmap load {loaded * 1000:.1f}ms"  # noqa: E231
+        )
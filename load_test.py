@@ -17,14 +17,42 @@ async def send_request(session, url, payload):
         return None
 
 
-async def load_test(num_clients, duration, proxy_url, target_url):
+def make_large_payload(size):
+    paragraph = (
+        "Quarterly notes from the support team. Jane Doe asked us to call her "
+        "back at 415-555-0199 about the renewal.\n\n"
+    )
+    return (paragraph * (size // len(paragraph) + 1))[:size]
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    avg = statistics.mean(latencies)
+
+    print(f"\n{name} ({len(latencies)} requests):")  # noqa: E231
+    print(f"  Avg Latency: {avg * 1000:.2f}ms")  # noqa: E231
+    print(f"  P50 Latency: {p50 * 1000:.2f}ms")  # noqa: E231
+    print(f"  P95 Latency: {p95 * 1000:.2f}ms")  # noqa: E231
+    print(f"  P99 Latency: {p99 * 1000:.2f}ms")  # noqa: E231
+    return p95
+
+
+async def load_test(
+    num_clients, duration, proxy_url, target_url, large_ratio=0.0, large_size=0
+):
     print(f"Starting load test with {num_clients} clients for {duration} seconds...")
 
     # Payloads
     clean_payload = "Hello world, this is a safe message."
     sensitive_payload = "My password is secret and my phone is 415-555-0199."
+    # Mixed-size workload: a share of the requests carry a large document, to
+    # see how they affect the latency of the small ones queued behind them
+    large_payload = make_large_payload(large_size) if large_ratio else None
 
-    latencies = []
+    latencies = {"small": [], "large": []}
     start_test = time.time()
 
     # Increase connection limit for high concurrency
@@ -33,35 +61,37 @@ async def load_test(num_clients, duration, proxy_url, target_url):
         tasks = []
         while time.time() - start_test < duration:
             # Batch of requests
+            kinds = []
             for _ in range(num_clients):
-                payload = random.choice([clean_payload, sensitive_payload])
+                if large_payload and random.random() < large_ratio:
+                    kinds.append("large")
+                    payload = large_payload
+                else:
+                    kinds.append("small")
+                    payload = random.choice([clean_payload, sensitive_payload])
                 # Use proxy
                 tasks.append(send_request(session, target_url, payload))
 
             # Wait for batch (simple simulation)
             results = await asyncio.gather(*tasks)
-            latencies.extend([r for r in results if r is not None])
+            for kind, result in zip(kinds, results):
+                if result is not None:
+                    latencies[kind].append(result)
             tasks = []
 
             # Small sleep to yield
             await asyncio.sleep(0.1)
 
-    if not latencies:
+    if not latencies["small"]:
         print("No successful requests.")
         return
 
     # Calculate stats
-    latencies.sort()
-    p50 = statistics.median(latencies)
-    p95 = latencies[int(len(latencies) * 0.95)]
-    p99 = latencies[int(len(latencies) * 0.99)]
-    avg = statistics.mean(latencies)
-
-    print(f"\nResults ({len(latencies)} requests):")  # noqa: E231
-    print(f"  Avg Latency: {avg * 1000:.2f}ms")  # noqa: E231
-    print(f"  P50 Latency: {p50 * 1000:.2f}ms")  # noqa: E231
-    print(f"  P95 Latency: {p95 * 1000:.2f}ms")  # noqa: E231
-    print(f"  P99 Latency: {p99 * 1000:.2f}ms")  # noqa: E231
+    if latencies["large"]:
+        p95 = report("Small requests", latencies["small"])
+        report(f"Large requests, {large_size} bytes", latencies["large"])
+    else:
+        p95 = report("Results", latencies["small"])
 
     if p95 < 0.5:
         print("\nSUCCESS: P95 Latency is < 500ms")
@@ -72,6 +102,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--clients", type=int, default=10)
     parser.add_argument("--duration", type=int, default=10)
+    parser.add_argument(
+        "--large-ratio", type=float, default=0.0,
+        help="Share of requests that carry a large document (mixed-size workload)",
+    )
+    parser.add_argument("--large-size", type=int, default=2_000_000)
     args = parser.parse_args()
 
     # Note: We need to configure aiohttp to use the proxy.
@@ -111,6 +146,9 @@ if __name__ == "__main__":
     # but with parallel workers it might be better, though still CPU bound.
 
     async def run_and_check():
-        await load_test(args.clients, args.duration, "http://localhost:8080", "http://httpbin.org/post")
+        await load_test(
+            args.clients, args.duration, "http://localhost:8080", "http://httpbin.org/post",
+            large_ratio=args.large_ratio, large_size=args.large_size,
+        )
 
     asyncio.run(run_and_check())
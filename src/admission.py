@@ -0,0 +1,117 @@
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from prometheus_client import Counter, Gauge
+
+from .config import AdmissionConfig, HostAdmissionPolicy
+from .policy_index import Route
+
+SHED_TOTAL = Counter(
+    "dlp_shed_total",
+    "Requests rejected by admission control, by reason and dlp.hosts route",
+    ["reason", "host"],
+)
+ADMITTED_INFLIGHT = Gauge(
+    "dlp_admission_inflight", "Requests currently admitted for DLP processing"
+)
+ADMITTED_BYTES = Gauge(
+    "dlp_admission_inflight_bytes", "Body bytes of the requests currently admitted"
+)
+
+
+class Rejection(NamedTuple):
+    status_code: int
+    retry_after: int
+    reason: str
+
+
+class AdmissionController:
+    """Bounds the DLP work in flight, globally and per dlp.hosts route.
+
+    ``admit`` either reserves a slot for the request body (to be given back
+    with ``release``) or returns the Rejection to answer with straight away,
+    so an overloaded proxy sheds load instead of queueing it without bound.
+    A route's ``admission`` policy caps the requests of every host and path
+    the route matches together, on top of the global limits.
+    """
+
+    def __init__(self, config: AdmissionConfig):
+        self.config = config
+        self.inflight = 0
+        self.inflight_bytes = 0
+        self._route_inflight: dict[str, int] = defaultdict(int)
+        self._route_bytes: dict[str, int] = defaultdict(int)
+
+    def admit(
+        self, route: Optional[Route], size: int, queue_full: bool = False
+    ) -> Optional[Rejection]:
+        if not self.config.enabled:
+            return None
+
+        policy = _policy(route)
+        rejection = (
+            policy and self._check_route(route.key, policy, size)
+        ) or self._check_global(size, queue_full)
+        if rejection:
+            # Routes come from the config, so the label set stays bounded
+            # whatever Host headers clients send
+            label = route.key if route is not None else "other"
+            SHED_TOTAL.labels(reason=rejection.reason, host=label).inc()
+            return rejection
+
+        self.inflight += 1
+        self.inflight_bytes += size
+        if policy:
+            self._route_inflight[route.key] += 1
+            self._route_bytes[route.key] += size
+        ADMITTED_INFLIGHT.set(self.inflight)
+        ADMITTED_BYTES.set(self.inflight_bytes)
+        return None
+
+    def release(self, route: Optional[Route], size: int):
+        if not self.config.enabled:
+            return
+        self.inflight -= 1
+        self.inflight_bytes -= size
+        if _policy(route):
+            key = route.key
+            self._route_inflight[key] -= 1
+            self._route_bytes[key] -= size
+            if not self._route_inflight[key]:
+                del self._route_inflight[key]
+                del self._route_bytes[key]
+        ADMITTED_INFLIGHT.set(self.inflight)
+        ADMITTED_BYTES.set(self.inflight_bytes)
+
+    def _check_route(
+        self, key: str, policy: HostAdmissionPolicy, size: int
+    ) -> Optional[Rejection]:
+        if (
+            policy.max_inflight is not None
+            and self._route_inflight[key] >= policy.max_inflight
+        ):
+            return Rejection(policy.status_code, policy.retry_after, "host_inflight")
+        if (
+            policy.max_inflight_bytes is not None
+            and self._route_bytes[key] + size > policy.max_inflight_bytes
+            # A single body larger than the limit still goes through alone
+            and self._route_bytes[key]
+        ):
+            return Rejection(policy.status_code, policy.retry_after, "host_bytes")
+        return None
+
+    def _check_global(self, size: int, queue_full: bool) -> Optional[Rejection]:
+        config = self.config
+        if queue_full:
+            reason = "queue_full"
+        elif self.inflight >= config.max_inflight:
+            reason = "inflight"
+        elif self.inflight_bytes and self.inflight_bytes + size > config.max_inflight_bytes:
+            reason = "bytes"
+        else:
+            return None
+        return Rejection(config.status_code, config.retry_after, reason)
+
+
+def _policy(route: Optional[Route]) -> Optional[HostAdmissionPolicy]:
+    return route.policy.admission if route is not None else None
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from prometheus_client import Counter, Gauge
+
+CACHE_HITS_TOTAL = Counter("dlp_cache_hits_total", "Redaction cache hits")
+CACHE_MISSES_TOTAL = Counter("dlp_cache_misses_total", "Redaction cache misses")
+CACHE_EVICTIONS_TOTAL = Counter(
+    "dlp_cache_evictions_total", "Entries evicted from the redaction cache"
+)
+CACHE_ENTRIES = Gauge("dlp_cache_entries", "Entries currently in the redaction cache")
+CACHE_BYTES = Gauge(
+    "dlp_cache_bytes", "Approximate memory held by the redaction cache in bytes"
+)
+
+
+class RedactionCache:
+    """LRU cache of redaction results bounded by entry count and by bytes.
+
+    Callers pass the approximate size of each value when storing it.
+    A bound of 0 disables the cache.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_MISSES_TOTAL.inc()
+            return None
+        self._entries.move_to_end(key)
+        CACHE_HITS_TOTAL.inc()
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        if not self.enabled:
+            return
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            CACHE_EVICTIONS_TOTAL.inc()
+        self._update_gauges()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._update_gauges()
+
+    def _update_gauges(self):
+        CACHE_ENTRIES.set(len(self._entries))
+        CACHE_BYTES.set(self._bytes)
@@ -1,4 +1,5 @@
 import typer
+import json
 import os
 import requests
 import re
@@ -98,12 +99,107 @@ def add_term(term: str):
         with open(terms_file, "a") as f:
             f.write(f"\n{term}")
         typer.echo(f"Added '{term}' to {terms_file}.")
-        typer.echo(
-            "Note: If the proxy is running, Vault poller will pick this up automatically if configured, otherwise restart proxy or wait for hot-reload."
-        )
+        if config.dlp.terms_watch_interval > 0:
+            typer.echo(
+                "Note: A running proxy picks this up automatically within "
+                f"{config.dlp.terms_watch_interval:g}s (dlp.terms_watch_interval)."
+            )
+        else:
+            typer.echo("Note: Hot-reload is disabled; restart the proxy to apply it.")
     else:
         typer.echo(f"'{term}' already exists in {terms_file}.")
 
 
+@app.command()
+def compile_terms(
+    output: str = typer.Option("terms.idx", help="Path of the compiled index."),
+    source: str = typer.Option(
+        None,
+        help="Terms file (one per line) or Vault export (.json). "
+        "Defaults to the configured static_terms_file.",
+    ),
+):
+    """
+    Compile static terms into a memory-mapped index (dlp.static_terms_index).
+    """
+    from src.matchers import compile_term_index, terms_from_mapping
+
+    source = source or config.dlp.static_terms_file
+    if not os.path.exists(source):
+        typer.echo(f"Error: {source} not found.")
+        raise typer.Exit(1)
+
+    if source.endswith(".json"):
+        with open(source, "r") as f:
+            data = json.load(f)
+        # `vault kv get -format=json` nests the secret under data.data
+        while isinstance(data.get("data"), dict):
+            data = data["data"]
+        lines = terms_from_mapping(data)
+    else:
+        with open(source, "r") as f:
+            lines = [line.strip() for line in f if line.strip()]
+
+    count = compile_term_index(
+        lines,
+        output,
+        whole_word=config.dlp.static_match_mode == "word",
+        case_sensitive=config.dlp.static_case_sensitive,
+    )
+    typer.echo(f"Compiled {count} terms from {source} into {output}.")
+
+
+@app.command()
+def pipeline_report(
+    corpus: str = typer.Option(
+        None, help="Texts to time, one per line. Defaults to the warm-up corpus."
+    ),
+    repeat: int = typer.Option(20, help="Passes over the corpus per analyzer."),
+):
+    """
+    Show what is pruned from the NLP pipeline for dlp.entities and the speedup.
+    """
+    import time
+
+    from src.dlp_engine import build_analyzer, load_warmup_corpus
+
+    model_name = config.dlp.nlp_model
+    entities = config.dlp.entities
+    texts = load_warmup_corpus(corpus or config.dlp.warmup_file)
+
+    analyzers = {
+        "full": build_analyzer(model_name, entities, prune=False),
+        "pruned": build_analyzer(model_name, entities),
+    }
+    pipes, recognizers, per_call = {}, {}, {}
+    for name, analyzer in analyzers.items():
+        engine = analyzer.analyzer_engine
+        pipes[name] = engine.nlp_engine.nlp["en"].pipe_names
+        recognizers[name] = [r.name for r in engine.registry.recognizers]
+        list(analyzer.analyze_iterator(texts, language="en", entities=entities))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(analyzer.analyze_iterator(texts, language="en", entities=entities))
+        per_call[name] = (time.perf_counter() - start) / (repeat * len(texts))
+
+    def removed(items):
+        dropped = [item for item in items["full"] if item not in items["pruned"]]
+        return ", ".join(dropped) or "none"
+
+    typer.echo(f"Model: {model_name}")
+    typer.echo(f"Entities: {', '.join(entities) if entities else 'all'}")
+    typer.echo(f"  spaCy components: {', '.join(pipes['pruned']) or 'tokenizer only'}")
+    typer.echo(f"    disabled: {removed(pipes)}")
+    typer.echo(f"  Recognizers: {len(recognizers['pruned'])} of {len(recognizers['full'])}")
+    typer.echo(f"    disabled: {removed(recognizers)}")
+    speedup = per_call["full"] / per_call["pruned"] if per_call["pruned"] else 0
+    typer.echo(
+        f"  Per call: {per_call['full'] * 1000:.2f}ms full, "  # noqa: E231
+        f"{per_call['pruned'] * 1000:.2f}ms pruned ({speedup:.1f}x)"  # noqa: E231
+    )
+    if not config.dlp.ml_prune_pipeline:
+        typer.echo("Note: dlp.ml_prune_pipeline is off; the proxy runs the full pipeline.")
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,240 @@
+import zlib
+from typing import Callable
+
+import brotli
+import zstandard
+from prometheus_client import Counter
+
+COMPRESSED_BYTES_TOTAL = Counter(
+    "dlp_compressed_bytes_total",
+    "Compressed body bytes decoded for scanning",
+    ["direction"],
+)
+DECOMPRESSED_BYTES_TOTAL = Counter(
+    "dlp_decompressed_bytes_total",
+    "Bytes produced by decoding compressed bodies",
+    ["direction"],
+)
+DECOMPRESSION_REJECTED_TOTAL = Counter(
+    "dlp_decompression_rejected_total",
+    "Compressed bodies rejected for exceeding the decompression ratio or size limit",
+    ["direction"],
+)
+
+SUPPORTED_ENCODINGS = ("gzip", "x-gzip", "deflate", "br", "zstd")
+
+# Largest piece of output produced at once, however much a chunk expands
+PIECE_SIZE = 64 * 1024
+# Decoded bytes always allowed before the ratio limit applies, so small
+# bodies that compress extremely well (e.g. padding, repeated JSON) pass
+RATIO_GRACE_BYTES = 1024 * 1024
+
+
+class DecompressionLimitExceeded(ValueError):
+    pass
+
+
+class StreamDecoder:
+    """Incrementally decompresses a body, handing the output to ``sink`` in
+    pieces of at most about PIECE_SIZE bytes, so a chunk that expands a
+    thousandfold is never held whole. Raises DecompressionLimitExceeded as
+    soon as the output exceeds ``max_ratio`` times the input read so far
+    (past RATIO_GRACE_BYTES) or ``max_size`` bytes."""
+
+    def __init__(
+        self,
+        encoding: str,
+        direction: str,
+        max_ratio: float = 0.0,
+        max_size: int = 0,
+    ):
+        self.encoding = encoding.lower()
+        if self.encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+        self.direction = direction
+        self.max_ratio = max_ratio
+        self.max_size = max_size
+        self.compressed = 0
+        self.decompressed = 0
+        self._zlib = None
+        self._brotli = brotli.Decompressor() if self.encoding == "br" else None
+        self._zstd_sink = _SinkWriter()
+        self._zstd = (
+            zstandard.ZstdDecompressor().stream_writer(
+                self._zstd_sink, write_size=PIECE_SIZE
+            )
+            if self.encoding == "zstd"
+            else None
+        )
+
+    def feed(self, data: bytes, sink: Callable[[bytes], None]):
+        self.compressed += len(data)
+        COMPRESSED_BYTES_TOTAL.labels(direction=self.direction).inc(len(data))
+
+        def checked(piece: bytes):
+            self._count(piece)
+            sink(piece)
+
+        try:
+            if self._brotli is not None:
+                self._feed_brotli(data, checked)
+            elif self._zstd is not None:
+                self._zstd_sink.sink = checked
+                self._zstd.write(data)
+            else:
+                self._feed_zlib(data, checked)
+        except (zlib.error, brotli.error, zstandard.ZstdError) as e:
+            raise ValueError(f"Invalid {self.encoding} body: {e}") from e
+
+    def _count(self, piece: bytes):
+        self.decompressed += len(piece)
+        DECOMPRESSED_BYTES_TOTAL.labels(direction=self.direction).inc(len(piece))
+        over_ratio = (
+            self.max_ratio > 0
+            and self.decompressed > RATIO_GRACE_BYTES
+            and self.decompressed > self.max_ratio * self.compressed
+        )
+        if over_ratio or 0 < self.max_size < self.decompressed:
+            DECOMPRESSION_REJECTED_TOTAL.labels(direction=self.direction).inc()
+            raise DecompressionLimitExceeded(
+                f"{self.encoding} body expands past "
+                + (f"{self.max_ratio:g}x" if over_ratio else f"{self.max_size} bytes")
+            )
+
+    def _feed_zlib(self, data: bytes, sink: Callable[[bytes], None]):
+        if self._zlib is None:
+            if not data:
+                return
+            self._zlib = zlib.decompressobj(_zlib_wbits(self.encoding, data))
+        while data:
+            piece = self._zlib.decompress(data, PIECE_SIZE)
+            data = self._zlib.unconsumed_tail
+            if piece:
+                sink(piece)
+            if self._zlib.eof and self._zlib.unused_data:
+                # Concatenated gzip members
+                data = self._zlib.unused_data
+                self._zlib = zlib.decompressobj(_zlib_wbits(self.encoding, data))
+
+    def _feed_brotli(self, data: bytes, sink: Callable[[bytes], None]):
+        # The output limit is approximate, and output can still be pending
+        # when can_accept_more_data() says True: drain until nothing is left
+        piece = self._brotli.process(data, output_buffer_limit=PIECE_SIZE)
+        while piece:
+            sink(piece)
+            piece = self._brotli.process(b"", output_buffer_limit=PIECE_SIZE)
+
+
+class _SinkWriter:
+    # File-like target of the zstd stream writer, which calls write() once per
+    # piece of output
+    sink: Callable[[bytes], None]
+
+    def write(self, data: bytes) -> int:
+        self.sink(bytes(data))
+        return len(data)
+
+
+def _zlib_wbits(encoding: str, first: bytes) -> int:
+    if encoding != "deflate":
+        return 16 + zlib.MAX_WBITS
+    # "deflate" is meant to be zlib-wrapped, but raw deflate is common too
+    if len(first) >= 2 and first[0] & 0x0F == 8 and int.from_bytes(first[:2]) % 31 == 0:
+        return zlib.MAX_WBITS
+    return -zlib.MAX_WBITS
+
+
+class StreamEncoder:
+    """Incrementally compresses a body. ``compress`` flushes at the end of
+    each call, so every chunk's data can be decoded as soon as it arrives
+    (streamed completions aren't held back by the compressor)."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding.lower()
+        if self.encoding in ("gzip", "x-gzip"):
+            self._compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self._compressor = zlib.compressobj()
+        elif self.encoding == "br":
+            self._compressor = brotli.Compressor()
+        elif self.encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedStreamRedactor:
+    """Wraps a StreamRedactor (or any stream callable) for a compressed body:
+    each chunk is decompressed piece by piece, scanned, and recompressed with
+    the same encoding, so only a piece of decoded text is held at a time.
+
+    A body that exceeds the ratio limit or doesn't decode can't be rejected
+    once its headers are gone, so the stream stops there: ``error`` is set
+    and nothing more is forwarded. What went out was scanned, and the
+    compressed body is left unterminated, so the receiver can't take the
+    truncated body for a complete one.
+    """
+
+    def __init__(
+        self,
+        redactor: Callable[[bytes], list[bytes]],
+        encoding: str,
+        direction: str,
+        max_ratio: float = 0.0,
+    ):
+        self.redactor = redactor
+        self.decoder = StreamDecoder(encoding, direction, max_ratio)
+        self.encoder = StreamEncoder(encoding)
+        self.error: str | None = None
+
+    @property
+    def pii_types(self) -> dict[str, int]:
+        return self.redactor.pii_types
+
+    def __call__(self, data: bytes) -> list[bytes]:
+        if self.error:
+            return []
+        out = []
+
+        def scan(piece: bytes):
+            out.extend(self.redactor(piece))
+
+        try:
+            self.decoder.feed(data, scan)
+        except ValueError as e:
+            self.error = str(e)
+            return []
+        if not data:
+            out.extend(self.redactor(b""))
+        encoded = b"".join(self.encoder.compress(chunk) for chunk in out)
+        if not data:
+            encoded += self.encoder.finish()
+        # As with StreamRedactor, never hand mitmproxy an empty chunk
+        return [encoded] if encoded else []
+
+
+def measure_decoded(
+    raw: bytes, encoding: str, direction: str, max_ratio: float, max_size: int
+) -> int:
+    """Decoded size of a buffered compressed body, computed piece by piece
+    without holding the output. Raises DecompressionLimitExceeded past either
+    limit."""
+    decoder = StreamDecoder(encoding, direction, max_ratio, max_size)
+    decoder.feed(raw, lambda piece: None)
+    return decoder.decompressed
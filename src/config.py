@@ -1,8 +1,8 @@
 import os
 import logging
 import yaml
-from typing import Optional, List
-from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, Optional, List, Literal
+from pydantic import BaseModel, Field, ValidationError, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 logger = logging.getLogger("dlp_proxy")
@@ -12,15 +12,45 @@ class VaultConfig(BaseModel):
     url: str = "http://localhost:8200"
     token: Optional[str] = None
     path: str = "aidlp/terms"
+    mount_point: str = "secret"
+    poll_interval: float = 60.0
+    snapshot_file: Optional[str] = None
 
 
 class SecretsProviderConfig(BaseModel):
     type: str = "file"
-    vault: Optional[VaultConfig] = None
+    vault: VaultConfig = Field(default_factory=VaultConfig)
+
+
+class JSONFieldPolicy(BaseModel):
+    path_prefix: str = "/"
+    profile: Optional[str] = None
+    fields: List[str] = Field(default_factory=list)
+
+
+class HostAdmissionPolicy(BaseModel):
+    max_inflight: Optional[int] = None
+    max_inflight_bytes: Optional[int] = None
+    status_code: int = 429
+    retry_after: int = 1
+
+
+class HostDLPPolicy(BaseModel):
+    passthrough: bool = False
+    detector: Optional[Literal["presidio", "patterns"]] = None
+    json_fields: List[JSONFieldPolicy] = Field(default_factory=list)
+    max_body_size: Optional[int] = None
+    latency_budget_ms: Optional[float] = None
+    admission: Optional[HostAdmissionPolicy] = None
 
 
 class DLPConfig(BaseModel):
     static_terms_file: str = "terms.txt"
+    static_terms_index: Optional[str] = None
+    static_matcher: Literal["flashtext", "aho_corasick", "marisa"] = "flashtext"
+    static_match_mode: Literal["word", "substring"] = "word"
+    static_case_sensitive: bool = False
+    terms_watch_interval: float = 5.0
     ml_enabled: bool = True
     ml_threshold: float = 0.5
     nlp_model: str = "en_core_web_sm"
@@ -29,6 +59,54 @@ class DLPConfig(BaseModel):
         default_factory=SecretsProviderConfig
     )
     replacement_token: str = "[REDACTED]"
+    ml_batch_size: int = 16
+    ml_batch_linger_ms: float = 5.0
+    ml_prune_pipeline: bool = True
+    ml_workers_min: int = 1
+    ml_workers_max: int = 0
+    ml_scale_up_wait_ms: float = 50.0
+    ml_worker_idle_timeout: float = 30.0
+    ml_queue_size: int = 1000
+    ml_scheduling: Literal["sjf", "fifo"] = "sjf"
+    ml_backend: Literal["thread", "process"] = "thread"
+    ml_processes: int = 0
+    ml_prefilter: bool = True
+    ml_min_length: int = 3
+    ml_force_full_analysis: bool = False
+    ml_chunk_size: int = 20000
+    ml_chunk_overlap: int = 200
+    cache_max_entries: int = 10000
+    cache_max_bytes: int = 64 * 1024 * 1024
+    latency_budget_ms: float = 0.0
+    latency_policy: Literal["fail_closed", "degrade"] = "fail_closed"
+    warmup_enabled: bool = True
+    warmup_file: Optional[str] = None
+    detector: Literal["presidio", "patterns"] = "presidio"
+    response_scan: bool = True
+    stream_carry_chars: int = 256
+    hosts: Dict[str, HostDLPPolicy] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def _check_chunking(self):
+        # Each chunk must start past the previous one's start, or large texts
+        # would be split into ever more redundant chunks
+        if self.ml_chunk_size < 0:
+            raise ValueError("ml_chunk_size must be >= 0")
+        if self.ml_chunk_overlap < 0 or (
+            self.ml_chunk_size and self.ml_chunk_overlap >= self.ml_chunk_size
+        ):
+            raise ValueError(
+                "ml_chunk_overlap must be >= 0 and smaller than ml_chunk_size"
+            )
+        return self
+
+
+class AdmissionConfig(BaseModel):
+    enabled: bool = True
+    max_inflight: int = 256
+    max_inflight_bytes: int = 128 * 1024 * 1024
+    status_code: int = 503
+    retry_after: int = 1
 
 
 class ProxyConfig(BaseModel):
@@ -36,6 +114,12 @@ class ProxyConfig(BaseModel):
     host: str = "0.0.0.0"
     ssl_bump: bool = True
     metrics_port: int = 9090
+    startup_timeout: float = 60.0
+    max_body_size: int = 10 * 1024 * 1024
+    stream_large_bodies: bool = True
+    stream_unknown_length: bool = False
+    max_decompression_ratio: float = 100.0
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig)
 
 
 class UpstreamConfig(BaseModel):
@@ -1,17 +1,334 @@
+import functools
+import hashlib
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import random
+import re
+import time
 import asyncio
 import hvac
 import pybreaker
+import requests
+import spacy
 
-from flashtext import KeywordProcessor
-from presidio_analyzer import AnalyzerEngine
-from presidio_analyzer.nlp_engine import NlpEngineProvider
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from presidio_analyzer import (
+    AnalyzerEngine,
+    BatchAnalyzerEngine,
+    RecognizerRegistry,
+)
+from presidio_analyzer.nlp_engine import NlpEngineProvider, SpacyNlpEngine
+from presidio_analyzer.nlp_engine.ner_model_configuration import (
+    LABELS_TO_IGNORE,
+    MODEL_TO_PRESIDIO_ENTITY_MAPPING,
+)
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+from prometheus_client import Counter, Gauge, Histogram
 
+from .cache import RedactionCache
 from .config import config
+from .matchers import MarisaMatcher, StaticMatcher, build_matcher, terms_from_mapping
+from .patterns import PatternEngine
+from .redaction import RedactionPlan, apply_plan, build_plan
 
 logger = logging.getLogger("dlp_proxy")
 
+ML_BATCH_FILL_RATIO = Histogram(
+    "dlp_ml_batch_fill_ratio",
+    "Size of each ML batch relative to the configured maximum batch size",
+    buckets=[0.1, 0.25, 0.5, 0.75, 1.0],
+)
+COALESCED_TOTAL = Counter(
+    "dlp_coalesced_total",
+    "Redactions that awaited an identical in-flight analysis instead of running",
+)
+ML_PREFILTER_TOTAL = Counter(
+    "dlp_ml_prefilter_total",
+    "Strings seen by the cheap prefilter tier, by decision",
+    ["decision"],
+)
+ML_POOL_RESTARTS_TOTAL = Counter(
+    "dlp_ml_pool_restarts_total",
+    "Number of times the ML process pool was restarted after a worker crash",
+)
+ML_WORKERS = Gauge("dlp_ml_workers", "Number of running ML worker tasks")
+ML_WORKERS_BUSY = Gauge(
+    "dlp_ml_workers_busy", "Number of ML workers currently analyzing a batch"
+)
+ML_QUEUE_WAIT_SECONDS = Histogram(
+    "dlp_ml_queue_wait_seconds",
+    "Time texts spent queued before an ML worker picked them up",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5],
+)
+STARTUP_SECONDS = Gauge(
+    "dlp_startup_seconds",
+    "Time spent in each startup stage of the proxy",
+    ["stage"],
+)
+
+# Default warm-up corpus: exercises the tokenizer, NER and the pattern
+# recognizers most prompts hit, so the first real requests don't pay for
+# lazy initialisation.
+WARMUP_CORPUS = [
+    "Hello, can you summarize this document for me?",
+    "My name is John Smith and my email is john.smith@example.com.",
+    "Call me at 415-555-0199 or write to 1 Market St, San Francisco.",
+    "Card 4111 1111 1111 1111 expires 12/29, IBAN DE89370400440532013000.",
+    "The server at 192.168.1.10 returned an error for user jane_doe.",
+]
+
+
+# Starting estimate of ML throughput before the first batch is measured, and
+# the weight each new measurement gets in the moving average
+_INITIAL_CHARS_PER_SECOND = 20000.0
+_THROUGHPUT_SMOOTHING = 0.2
+
+# Rough in-memory footprint of a cached (plan, stats) entry, for the byte bound
+_PLAN_BASE_SIZE = 512
+_SPAN_SIZE = 160
+
+# Enum-like values such as "assistant", "gpt-4o", "tool_choice" or "0.7"
+_TOKEN_RE = re.compile(r"[a-z0-9_\-]+|[-+]?\d+(?:\.\d+)?")
+# Fewer digits than this can't form a phone, card, account or IP address
+_MIN_ENTITY_DIGITS = 5
+
+
+def prefilter_decision(text: str, min_length: int) -> str:
+    """Cheap first tier: decide whether a string can contain an entity worth
+    running NER on. Returns "analyze", or the reason ("short", "token") the
+    expensive tier can be skipped."""
+    stripped = text.strip()
+    if len(stripped) < min_length:
+        return "short"
+    if _TOKEN_RE.fullmatch(stripped):
+        digits = sum(c.isdigit() for c in stripped)
+        if digits < _MIN_ENTITY_DIGITS:
+            return "token"
+    return "analyze"
+
+
+# Preferred places to cut a large text, strongest boundary first
+_CHUNK_SEPARATORS = ("\n\n", ". ", "! ", "? ", "\n", " ")
+
+
+def split_chunks(text: str, size: int, overlap: int) -> list[tuple[int, str]]:
+    """Split text into (offset, chunk) pieces of at most ``size`` characters.
+
+    Cuts land on paragraph or sentence boundaries where possible, and each
+    chunk starts ``overlap`` characters before the previous one ended so an
+    entity straddling a cut is still seen whole by one of the chunks.
+    """
+    chunks = []
+    start, n = 0, len(text)
+    while True:
+        end = min(start + size, n)
+        if end < n:
+            # Don't shrink a chunk below half its size looking for a boundary
+            lo = start + size // 2
+            for sep in _CHUNK_SEPARATORS:
+                idx = text.rfind(sep, lo, end)
+                if idx != -1:
+                    end = idx + len(sep)
+                    break
+        chunks.append((start, text[start:end]))
+        if end >= n:
+            return chunks
+
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary rather than mid-token
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+
+def dedupe_spans(spans) -> list[tuple[int, int, str]]:
+    """Drop spans repeated across chunk overlaps, including partial detections
+    contained in a larger span of the same entity type."""
+    result = []
+    furthest_end: dict[str, int] = {}
+    # Sorted by start, longest first, so a containing span is always seen first
+    for start, end, etype in sorted(set(spans), key=lambda s: (s[0], -s[1])):
+        if end <= furthest_end.get(etype, -1):
+            continue
+        furthest_end[etype] = end
+        result.append((start, end, etype))
+    return result
+
+
+def empty_stats() -> dict:
+    return {
+        "static_replacements": 0,
+        "ml_replacements": 0,
+        "pattern_replacements": 0,
+        "pii_types": {},
+        "degraded": 0,
+    }
+
+
+def merge_stats(into: dict, stats: dict) -> dict:
+    into["static_replacements"] += stats.get("static_replacements", 0)
+    into["ml_replacements"] += stats.get("ml_replacements", 0)
+    into["pattern_replacements"] += stats.get("pattern_replacements", 0)
+    into["degraded"] += stats.get("degraded", 0)
+    for pii, count in stats.get("pii_types", {}).items():
+        into["pii_types"][pii] = into["pii_types"].get(pii, 0) + count
+    return into
+
+
+TERMS_RELOAD_SECONDS = Histogram(
+    "dlp_terms_reload_seconds",
+    "Time spent loading terms and building a new static matcher",
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0],
+)
+TERMS_VERSION = Gauge(
+    "dlp_terms_version", "Version of the static term set currently in use"
+)
+TERMS_LOADED = Gauge("dlp_terms_loaded", "Number of static terms currently loaded")
+
+# Analyzer used inside ML worker processes. The parent sets it before the pool
+# forks, so children inherit the loaded model as copy-on-write pages.
+_process_analyzer = None
+
+
+# spaCy components Presidio never reads: it only uses tokens, lemmas (for
+# context words) and entities.
+_UNUSED_PIPES = ("parser", "senter")
+_NER_PIPES = ("ner", "entity_ruler")
+
+
+def _ner_entities(model_name: str) -> set[str]:
+    """Presidio entity types the model's NER component can produce."""
+    try:
+        meta = spacy.util.get_model_meta(spacy.util.get_package_path(model_name))
+        labels = meta.get("labels", {}).get("ner")
+    except Exception:
+        labels = None
+    if not labels:
+        # Unknown model: assume it can produce anything Presidio maps
+        return set(MODEL_TO_PRESIDIO_ENTITY_MAPPING.values())
+    return {
+        MODEL_TO_PRESIDIO_ENTITY_MAPPING[label]
+        for label in labels
+        if label in MODEL_TO_PRESIDIO_ENTITY_MAPPING and label not in LABELS_TO_IGNORE
+    }
+
+
+def pipeline_exclusions(model_name: str, entities: list[str] | None) -> list[str]:
+    """spaCy components that can be left out of ``model_name`` when only
+    ``entities`` are detected (None = all entity types)."""
+    excluded = list(_UNUSED_PIPES)
+    if entities is not None and not set(entities) & _ner_entities(model_name):
+        excluded.extend(_NER_PIPES)
+    return excluded
+
+
+def _load_nlp_engine(model_name: str, exclude: list[str] = ()):
+    if not exclude:
+        nlp_configuration = {
+            "nlp_engine_name": "spacy",
+            "models": [{"lang_code": "en", "model_name": model_name}],
+        }
+        provider = NlpEngineProvider(nlp_configuration=nlp_configuration)
+        return provider.create_engine()
+    nlp_engine = SpacyNlpEngine(models=[{"lang_code": "en", "model_name": model_name}])
+    nlp_engine.nlp = {"en": spacy.load(model_name, exclude=list(exclude))}
+    return nlp_engine
+
+
+def _build_registry(
+    nlp_engine, exclude: list[str], entities: list[str] | None
+) -> RecognizerRegistry:
+    registry = RecognizerRegistry()
+    registry.load_predefined_recognizers(languages=["en"], nlp_engine=nlp_engine)
+    recognizers = registry.recognizers
+    if "ner" in exclude:
+        # Without the NER component the spaCy recognizer can't find anything
+        recognizers = [r for r in recognizers if not isinstance(r, SpacyRecognizer)]
+    if entities is not None:
+        wanted = set(entities)
+        recognizers = [r for r in recognizers if wanted & set(r.supported_entities)]
+    registry.recognizers = recognizers
+    return registry
+
+
+def _build_batch_analyzer(
+    model_name: str,
+    nlp_engine=None,
+    exclude: list[str] = (),
+    entities: list[str] | None = None,
+) -> BatchAnalyzerEngine:
+    """Build the analyzer. ``exclude`` leaves spaCy components out of the
+    model; ``entities`` keeps only the recognizers for those types."""
+    if nlp_engine is None:
+        nlp_engine = _load_nlp_engine(model_name, exclude)
+    registry = _build_registry(nlp_engine, exclude, entities)
+    return BatchAnalyzerEngine(
+        analyzer_engine=AnalyzerEngine(
+            nlp_engine=nlp_engine, registry=registry, supported_languages=["en"]
+        )
+    )
+
+
+def build_analyzer(
+    model_name: str, entities: list[str] | None, prune: bool = True
+) -> BatchAnalyzerEngine:
+    """Analyzer for ``entities``, pruned to what they need unless ``prune``
+    is False."""
+    if not prune:
+        return _build_batch_analyzer(model_name)
+    return _build_batch_analyzer(
+        model_name,
+        exclude=pipeline_exclusions(model_name, entities),
+        entities=entities,
+    )
+
+
+def load_warmup_corpus(path: str | None) -> list[str]:
+    """Warm-up texts from ``path`` (one per line), or the built-in corpus."""
+    if not path:
+        return list(WARMUP_CORPUS)
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _analyze_spans(
+    batch_analyzer: BatchAnalyzerEngine,
+    texts: list[str],
+    entities: list[str] | None,
+    threshold: float,
+) -> list[list[tuple[int, int, str]]]:
+    # analyze_iterator runs spaCy's nlp.pipe once over the whole batch
+    results = batch_analyzer.analyze_iterator(texts, language="en", entities=entities)
+    return [
+        [(r.start, r.end, r.entity_type) for r in res if r.score >= threshold]
+        for res in results
+    ]
+
+
+def _init_process_worker(
+    model_name: str, exclude: list[str], entities: list[str] | None
+):
+    # Forked workers already inherited the parent's analyzer; spawned ones
+    # (platforms without fork) have to load the model themselves.
+    global _process_analyzer
+    if _process_analyzer is None:
+        _process_analyzer = _build_batch_analyzer(
+            model_name, exclude=exclude, entities=entities
+        )
+
+
+def _analyze_in_process(
+    texts: list[str], entities: list[str] | None, threshold: float
+) -> list[list[tuple[int, int, str]]]:
+    return _analyze_spans(_process_analyzer, texts, entities, threshold)
+
+
+class DLPTimeoutError(Exception):
+    """ML analysis did not finish within the request's latency budget."""
+
 
 class TermProvider:
     def get_terms(self) -> list[str]:
@@ -33,22 +350,74 @@ class FileTermProvider(TermProvider):
 
 
 class VaultTermProvider(TermProvider):
-    def __init__(self, url: str, token: str, path: str, mount_point: str = "secret"):
-        self.client = hvac.Client(url=url, token=token)
+    """Long-lived Vault KV v2 term source.
+
+    Keeps one client (and its pooled HTTP session) across polls, checks the
+    secret's ``current_version`` before downloading it, and persists the last
+    good term list to ``snapshot_file`` so a cold start during a Vault outage
+    still comes up with terms.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        path: str,
+        mount_point: str = "secret",
+        snapshot_file: str | None = None,
+    ):
+        self.client = hvac.Client(url=url, token=token, session=requests.Session())
         self.path = path
         self.mount_point = mount_point
+        self.snapshot_file = snapshot_file
         self.breaker = pybreaker.CircuitBreaker(fail_max=3, reset_timeout=60)
-        self._cached_terms = []
+        self.failures = 0
+        self._version = None
+        self._cached_terms = self._load_snapshot()
 
     def get_terms(self) -> list[str]:
         try:
             return self.breaker.call(self._fetch_from_vault)
         except pybreaker.CircuitBreakerError:
             logger.error("Vault Circuit Breaker open. Using cached terms.")
-            return self._cached_terms
         except Exception as e:
             logger.error(f"Failed to fetch terms from Vault: {e}")
-            return self._cached_terms
+        self.failures += 1
+        return self._cached_terms
+
+    def get_terms_if_changed(self) -> list[str] | None:
+        """Return the terms if the secret's version moved since the last
+        successful fetch, or None if the terms in use are still current."""
+        if self._version is None:
+            # Nothing fetched yet: full fetch, falling back to the snapshot
+            return self.get_terms()
+        try:
+            version = self.breaker.call(self._current_version)
+        except pybreaker.CircuitBreakerError:
+            logger.error("Vault Circuit Breaker open. Keeping current terms.")
+            self.failures += 1
+            return None
+        except Exception as e:
+            logger.error(f"Failed to read Vault secret metadata: {e}")
+            self.failures += 1
+            return None
+
+        self.failures = 0
+        if version == self._version:
+            return None
+        return self.get_terms()
+
+    def next_poll_delay(self, interval: float, max_backoff: float = 900.0) -> float:
+        """Poll interval with +/-10% jitter, doubling per consecutive failure
+        (capped at ``max_backoff``) so a down Vault isn't hammered."""
+        delay = interval * 2 ** min(self.failures, 10)
+        return min(delay, max(interval, max_backoff)) * random.uniform(0.9, 1.1)
+
+    def _current_version(self) -> int:
+        metadata = self.client.secrets.kv.v2.read_secret_metadata(
+            path=self.path, mount_point=self.mount_point
+        )
+        return metadata["data"]["current_version"]
 
     def _fetch_from_vault(self) -> list[str]:
         if not self.client.is_authenticated():
@@ -57,92 +426,468 @@ class VaultTermProvider(TermProvider):
         read_response = self.client.secrets.kv.v2.read_secret_version(
             path=self.path, mount_point=self.mount_point
         )
-        data = read_response["data"]["data"]
-        terms = []
-        for key, value in data.items():
-            if isinstance(value, list):
-                terms.extend([str(v) for v in value])
-            else:
-                terms.append(str(value))
+        terms = terms_from_mapping(read_response["data"]["data"])
 
+        self._version = read_response["data"].get("metadata", {}).get("version")
         self._cached_terms = terms
+        self.failures = 0
+        self._save_snapshot(terms)
         return terms
 
+    def _load_snapshot(self) -> list[str]:
+        if not self.snapshot_file or not os.path.exists(self.snapshot_file):
+            return []
+        try:
+            with open(self.snapshot_file, "r") as f:
+                terms = json.load(f)["terms"]
+            logger.info(f"Loaded {len(terms)} terms from Vault snapshot")
+            return terms
+        except Exception as e:
+            logger.error(f"Failed to read Vault snapshot: {e}")
+            return []
+
+    def _save_snapshot(self, terms: list[str]):
+        if not self.snapshot_file:
+            return
+        tmp_path = f"{self.snapshot_file}.tmp"
+        try:
+            # The snapshot holds secrets: owner-only permissions
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": self._version, "terms": terms}, f)
+            os.replace(tmp_path, self.snapshot_file)
+        except Exception as e:
+            logger.error(f"Failed to write Vault snapshot: {e}")
+
 
 class DLPEngine:
-    def __init__(self):
-        self.keyword_processor = KeywordProcessor()
+    def __init__(self, lazy: bool = False):
+        self.static_matcher: StaticMatcher = build_matcher(config.dlp.static_matcher, [])
         self.ml_enabled = config.dlp.ml_enabled
         self.ml_threshold = config.dlp.ml_threshold
         self.entities = config.dlp.entities
         self.replacement_token = config.dlp.replacement_token
+        # "presidio" runs the NER pipeline (through the ML queue); "patterns"
+        # runs the combined regex scan inline. Callers may pick per request.
+        self.detector = config.dlp.detector
+        self.pattern_engine = PatternEngine(self.entities)
+
+        self.prefilter = (
+            config.dlp.ml_prefilter and not config.dlp.ml_force_full_analysis
+        )
+        self.min_length = config.dlp.ml_min_length
+
+        self.chunk_size = config.dlp.ml_chunk_size
+        self.chunk_overlap = config.dlp.ml_chunk_overlap
+
+        self.batch_size = max(1, config.dlp.ml_batch_size)
+        self.batch_linger = config.dlp.ml_batch_linger_ms / 1000
+
+        self.ml_backend = config.dlp.ml_backend
+        self.ml_processes = config.dlp.ml_processes or os.cpu_count() or 1
+
+        # The worker pool grows between min and max when texts wait in the
+        # queue longer than scale_up_wait, and shrinks after idle_timeout.
+        self.min_workers = max(1, config.dlp.ml_workers_min)
+        default_max = (
+            2 * self.ml_processes if self.ml_backend == "process" else os.cpu_count() or 1
+        )
+        self.max_workers = max(
+            config.dlp.ml_workers_max or default_max, self.min_workers
+        )
+        self.scale_up_wait = config.dlp.ml_scale_up_wait_ms / 1000
+        # Measured analysis throughput (chars/s), used to turn a text's length
+        # into an estimated cost; None schedules first-come first-served
+        self.cost_rate = (
+            _INITIAL_CHARS_PER_SECOND if config.dlp.ml_scheduling == "sjf" else None
+        )
+        self.idle_timeout = config.dlp.ml_worker_idle_timeout
+        self.busy_workers = 0
 
         self.analyzer = None
-        if self.ml_enabled:
-            model_name = config.dlp.nlp_model
-            logger.info(f"Loading NLP model: {model_name}")
-            nlp_configuration = {
-                "nlp_engine_name": "spacy",
-                "models": [{"lang_code": "en", "model_name": model_name}],
-            }
-            provider = NlpEngineProvider(nlp_configuration=nlp_configuration)
-            nlp_engine = provider.create_engine()
-            self.analyzer = AnalyzerEngine(nlp_engine=nlp_engine)
-
-        self.reload_config()
-        self.task_queue = asyncio.Queue(maxsize=1000)
+        self.batch_analyzer = None
+        self.process_pool = None
+        self.loaded = False
+        # Only load the spaCy components and recognizers `entities` needs
+        self.prune_pipeline = config.dlp.ml_prune_pipeline
+        self.pipeline_exclude = []
+
+        # Cached results are keyed on the term-set version and the ML settings
+        # that produced them; reload_config bumps the version and clears.
+        self.terms_version = 0
+        self.ml_fingerprint = hashlib.blake2b(
+            repr(
+                (
+                    self.ml_enabled,
+                    self.ml_threshold,
+                    self.entities,
+                    config.dlp.nlp_model,
+                    self.replacement_token,
+                    self.prefilter,
+                    self.min_length,
+                    self.chunk_size,
+                    self.chunk_overlap,
+                )
+            ).encode(),
+            digest_size=8,
+        ).hexdigest()
+        self.cache = RedactionCache(
+            config.dlp.cache_max_entries, config.dlp.cache_max_bytes
+        )
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._terms_fingerprint = None
+        self._vault_provider = None
+
+        # Queued texts are served in order of arrival plus their estimated
+        # cost, so short texts overtake large ones that arrived shortly before
+        # them, while waiting lowers a large text's key until it runs.
+        self.task_queue = asyncio.PriorityQueue(maxsize=config.dlp.ml_queue_size)
+        self._queue_seq = itertools.count()
         self.workers = []
         self.poller_task = None
+        self.watcher_task = None
+
+        # A lazy engine is loaded later (in a thread) by the proxy, so the
+        # port can be bound before the models are in memory.
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """Load the static terms and the NLP models. Blocking."""
+        with STARTUP_SECONDS.labels(stage="terms_load").time():
+            self.reload_config()
+
+        if self.ml_enabled and self.batch_analyzer is None:
+            model_name = config.dlp.nlp_model
+            if self.prune_pipeline:
+                self.pipeline_exclude = pipeline_exclusions(model_name, self.entities)
+            logger.info(
+                f"Loading NLP model: {model_name}",
+                extra={"excluded_components": self.pipeline_exclude},
+            )
+            with STARTUP_SECONDS.labels(stage="model_load").time():
+                nlp_engine = _load_nlp_engine(model_name, self.pipeline_exclude)
+            with STARTUP_SECONDS.labels(stage="registry_build").time():
+                self.batch_analyzer = _build_batch_analyzer(
+                    model_name,
+                    nlp_engine,
+                    exclude=self.pipeline_exclude,
+                    entities=self._registry_entities(),
+                )
+            self.analyzer = self.batch_analyzer.analyzer_engine
+            if self.ml_backend == "process":
+                self._start_process_pool()
+                # Keep every process busy even while batches are being collected
+                self.min_workers = min(
+                    max(self.min_workers, self.ml_processes), self.max_workers
+                )
+        self.loaded = True
+
+    def _registry_entities(self) -> list[str] | None:
+        return self.entities if self.prune_pipeline else None
+
+    async def warm_up(self, corpus: list[str]) -> int:
+        """Run ``corpus`` through the full analysis path, bypassing the cache,
+        so every ML worker has done real work before traffic arrives. Needs
+        the workers to be running. Returns the number of texts analyzed."""
+        if not corpus:
+            return 0
+        if self.ml_enabled and self.analyzer and not self.workers:
+            raise RuntimeError("start_workers() must be called before warm_up()")
+        texts = corpus * max(1, len(self.workers))
+        with STARTUP_SECONDS.labels(stage="warm_up").time():
+            await asyncio.gather(*(self._plan(text) for text in texts))
+        return len(texts)
+
+    def _start_process_pool(self):
+        global _process_analyzer
+        _process_analyzer = self.batch_analyzer
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = multiprocessing.get_context("spawn")
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=self.ml_processes,
+            mp_context=mp_context,
+            initializer=_init_process_worker,
+            initargs=(
+                config.dlp.nlp_model,
+                self.pipeline_exclude,
+                self._registry_entities(),
+            ),
+        )
+        logger.info(f"Started ML process pool with {self.ml_processes} processes")
+
+    def _restart_process_pool(self, broken_pool: ProcessPoolExecutor):
+        # Several workers can observe the same crash; only replace the pool once.
+        if self.process_pool is not broken_pool:
+            return
+        logger.error("ML worker process died, restarting process pool")
+        ML_POOL_RESTARTS_TOTAL.inc()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        self._start_process_pool()
 
     def start_workers(self):
         if self.ml_enabled and not self.workers:
-            for _ in range(4):
-                self.workers.append(asyncio.create_task(self._ml_worker()))
+            for _ in range(self.min_workers):
+                self._spawn_worker()
 
         if config.dlp.secrets_provider.type == "vault" and not self.poller_task:
             self.poller_task = asyncio.create_task(self._vault_poller())
 
+        if config.dlp.terms_watch_interval > 0 and not self.watcher_task:
+            self.watcher_task = asyncio.create_task(self._terms_watcher())
+
     def shutdown(self):
-        for worker in self.workers:
+        for worker in list(self.workers):
             worker.cancel()
         if self.poller_task:
             self.poller_task.cancel()
+        if self.watcher_task:
+            self.watcher_task.cancel()
+        if self.process_pool:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
 
     async def _vault_poller(self):
+        interval = config.dlp.secrets_provider.vault.poll_interval
         while True:
-            await asyncio.sleep(60)
+            provider = self._vault_provider
+            delay = provider.next_poll_delay(interval) if provider else interval
+            await asyncio.sleep(delay)
             logger.info("Polling Vault for new terms...")
-            self.reload_config()
+            try:
+                await self.reload_config_async()
+            except Exception as e:
+                logger.error(f"Failed to reload terms from Vault: {e}")
 
-    async def _ml_worker(self):
+    def _watched_terms_path(self) -> str | None:
+        index_path = config.dlp.static_terms_index
+        if index_path and os.path.exists(index_path):
+            return index_path
+        if config.dlp.secrets_provider.type != "vault":
+            return config.dlp.static_terms_file
+        return None
+
+    async def _terms_watcher(self):
+        """Reload when the terms file (or compiled index) changes on disk."""
+
+        def file_state(path):
+            try:
+                st = os.stat(path)
+                return path, st.st_mtime_ns, st.st_size
+            except (OSError, TypeError):
+                return path, None, None
+
+        last = file_state(self._watched_terms_path())
         while True:
-            text, future = await self.task_queue.get()
+            await asyncio.sleep(config.dlp.terms_watch_interval)
+            current = file_state(self._watched_terms_path())
+            if current == last:
+                continue
+            last = current
+            logger.info(f"Terms source changed, reloading: {current[0]}")
             try:
-                results = await asyncio.to_thread(
-                    self.analyzer.analyze,
-                    text=text,
-                    language="en",
-                    entities=self.entities,
-                )
-                filtered = [r for r in results if r.score >= self.ml_threshold]
-                future.set_result(filtered)
+                await self.reload_config_async()
             except Exception as e:
-                future.set_exception(e)
-            finally:
+                logger.error(f"Failed to reload terms: {e}")
+
+    def _spawn_worker(self):
+        self.workers.append(asyncio.create_task(self._ml_worker()))
+        ML_WORKERS.set(len(self.workers))
+
+    def _maybe_scale_up(self, wait: float):
+        """Add a worker when queued texts waited longer than scale_up_wait, or
+        there are more of them than the idle workers can take in one batch."""
+        if not self.workers or len(self.workers) >= self.max_workers:
+            return
+        idle = len(self.workers) - self.busy_workers
+        if wait > self.scale_up_wait or self.task_queue.qsize() > idle * self.batch_size:
+            self._spawn_worker()
+
+    async def _ml_worker(self):
+        try:
+            while True:
+                batch = await self._next_batch()
+                if batch is not None:
+                    await self._process_batch(batch)
+                elif len(self.workers) > self.min_workers:
+                    # Idle for idle_timeout and above the minimum: retire
+                    return
+        finally:
+            self.workers.remove(asyncio.current_task())
+            ML_WORKERS.set(len(self.workers))
+
+    async def _process_batch(self, batch: list):
+        now = asyncio.get_running_loop().time()
+        for _, _, enqueued in batch:
+            ML_QUEUE_WAIT_SECONDS.observe(now - enqueued)
+        self._maybe_scale_up(now - batch[0][2])
+        ML_BATCH_FILL_RATIO.observe(len(batch) / self.batch_size)
+
+        self.busy_workers += 1
+        ML_WORKERS_BUSY.set(self.busy_workers)
+        try:
+            texts = [text for text, _, _ in batch]
+            started = time.perf_counter()
+            results = await self._run_batch(texts)
+            self._observe_throughput(texts, time.perf_counter() - started)
+            for (_, future, _), filtered in zip(batch, results):
+                if not future.done():
+                    future.set_result(filtered)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.busy_workers -= 1
+            ML_WORKERS_BUSY.set(self.busy_workers)
+            for _ in batch:
                 self.task_queue.task_done()
 
+    def _observe_throughput(self, texts: list[str], elapsed: float):
+        if self.cost_rate is None or elapsed <= 0:
+            return
+        rate = sum(len(text) for text in texts) / elapsed
+        self.cost_rate += _THROUGHPUT_SMOOTHING * (rate - self.cost_rate)
+
+    async def _next_batch(self) -> list | None:
+        """Wait for one queued item, then drain up to batch_size items or until
+        the linger time runs out, whichever comes first. Returns None if
+        nothing arrived within idle_timeout."""
+        loop = asyncio.get_running_loop()
+        try:
+            first = await asyncio.wait_for(
+                self.task_queue.get(), timeout=self.idle_timeout or None
+            )
+        except asyncio.TimeoutError:
+            return None
+        # Queue items are (priority, seq, text, future, enqueued_at)
+        batch = [first[2:]]
+        chars = len(first[2])
+        deadline = loop.time() + self.batch_linger
+        while len(batch) < self.batch_size:
+            try:
+                item = self.task_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(
+                        self.task_queue.get(), timeout=remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
+            # A batch carries at most about one chunk of text, so the chunks
+            # of a large document spread across workers, and short texts are
+            # never held up by sharing a batch with one
+            if self.chunk_size and chars + len(item[2]) > self.chunk_size:
+                self._requeue(item)
+                break
+            batch.append(item[2:])
+            chars += len(item[2])
+        return batch
+
+    def _requeue(self, item: tuple):
+        # Room is guaranteed: the item was taken from the queue without an
+        # await in between. task_done() undoes put_nowait()'s extra count.
+        self.task_queue.put_nowait(item)
+        self.task_queue.task_done()
+
+    async def _run_batch(self, texts: list[str]) -> list[list[tuple[int, int, str]]]:
+        pool = self.process_pool
+        if pool is None:
+            return await asyncio.to_thread(self._analyze_batch, texts)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                pool, _analyze_in_process, texts, self.entities, self.ml_threshold
+            )
+        except BrokenProcessPool:
+            # Retry once on a fresh pool so a crashed worker doesn't fail requests
+            self._restart_process_pool(pool)
+            return await loop.run_in_executor(
+                self.process_pool,
+                _analyze_in_process,
+                texts,
+                self.entities,
+                self.ml_threshold,
+            )
+
+    def _analyze_batch(self, texts: list[str]) -> list[list[tuple[int, int, str]]]:
+        return _analyze_spans(
+            self.batch_analyzer, texts, self.entities, self.ml_threshold
+        )
+
     def reload_config(self):
-        new_kp = KeywordProcessor()
+        """Reload static terms synchronously (used at startup)."""
+        self._publish_matcher(*self._build_static_matcher())
+
+    async def reload_config_async(self):
+        """Load terms and build the new matcher in an executor, so neither the
+        provider I/O nor the build stalls the event loop, then swap it in."""
+        loop = asyncio.get_running_loop()
+        matcher, fingerprint = await loop.run_in_executor(
+            None, self._build_static_matcher
+        )
+        self._publish_matcher(matcher, fingerprint)
+
+    def _build_static_matcher(self) -> tuple[StaticMatcher | None, str]:
+        """Returns (None, fingerprint) when the term set hasn't changed."""
+        start = time.perf_counter()
+        index_path = config.dlp.static_terms_index
+        if index_path and os.path.exists(index_path):
+            # Precompiled snapshot (cli compile-terms), shared via mmap
+            st = os.stat(index_path)
+            fingerprint = f"index:{index_path}:{st.st_mtime_ns}:{st.st_size}"
+            if fingerprint == self._terms_fingerprint:
+                return None, fingerprint
+            matcher = MarisaMatcher.load(index_path)
+            TERMS_LOADED.set(matcher.term_count)
+            logger.info(f"Loaded compiled term index: {index_path}")
+        else:
+            terms = self._load_terms()
+            if terms is None:
+                return None, self._terms_fingerprint
+            fingerprint = hashlib.blake2b(
+                "\n".join(terms).encode("utf-8", "surrogatepass"), digest_size=16
+            ).hexdigest()
+            if fingerprint == self._terms_fingerprint:
+                logger.info("Static terms unchanged, keeping current matcher")
+                return None, fingerprint
+            matcher = build_matcher(
+                config.dlp.static_matcher,
+                terms,
+                whole_word=config.dlp.static_match_mode == "word",
+                case_sensitive=config.dlp.static_case_sensitive,
+            )
+            TERMS_LOADED.set(len(terms))
+
+        TERMS_RELOAD_SECONDS.observe(time.perf_counter() - start)
+        return matcher, fingerprint
+
+    def _load_terms(self) -> list[str] | None:
+        """Returns None when the provider reports the terms are unchanged."""
         provider_type = config.dlp.secrets_provider.type
         terms = []
 
         if provider_type == "vault":
-            url = config.dlp.secrets_provider.vault.url
-            token = config.dlp.secrets_provider.vault.token or os.getenv("VAULT_TOKEN")
-            path = config.dlp.secrets_provider.vault.path
-            if url and token and path:
-                provider = VaultTermProvider(url, token, path)
-                terms = provider.get_terms()
+            vault = config.dlp.secrets_provider.vault
+            token = vault.token or os.getenv("VAULT_TOKEN")
+            if vault.url and token and vault.path:
+                if self._vault_provider is None:
+                    self._vault_provider = VaultTermProvider(
+                        vault.url,
+                        token,
+                        vault.path,
+                        mount_point=vault.mount_point,
+                        snapshot_file=vault.snapshot_file,
+                    )
+                terms = self._vault_provider.get_terms_if_changed()
+                if terms is None:
+                    logger.info("Vault terms unchanged")
+                    return None
                 logger.info(f"Loaded {len(terms)} terms from Vault")
             else:
                 logger.error("Vault configuration missing")
@@ -151,53 +896,226 @@ class DLPEngine:
             provider = FileTermProvider(file_path)
             terms = provider.get_terms()
             logger.info(f"Loaded {len(terms)} terms from file: {file_path}")
+        return terms
+
+    def _publish_matcher(self, matcher: StaticMatcher | None, fingerprint: str):
+        if matcher is None:
+            return
+        # A single reference swap: scans already running keep the old matcher
+        self.static_matcher = matcher
+        self._terms_fingerprint = fingerprint
+        self.terms_version += 1
+        TERMS_VERSION.set(self.terms_version)
+        self.cache.clear()
+
+    def _cache_key(self, text: str, detector: str) -> tuple:
+        digest = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        return (self.terms_version, self.ml_fingerprint, detector, digest)
+
+    async def redact(
+        self,
+        text: str,
+        deadline: float | None = None,
+        degrade: bool = False,
+        detector: str | None = None,
+    ) -> tuple[str, dict]:
+        plan, stats = await self.plan(text, deadline, degrade, detector)
+        return apply_plan(text, plan, self.replacement_token), stats
+
+    async def plan(
+        self,
+        text: str,
+        deadline: float | None = None,
+        degrade: bool = False,
+        detector: str | None = None,
+    ) -> tuple[RedactionPlan, dict]:
+        """Detect everything to redact in text and return the redaction plan
+        (sorted, merged spans with their entity types) plus stats, without
+        building the output. Results are cached and coalesced.
+
+        ``detector`` overrides dlp.detector for this text ("presidio" or
+        "patterns").
+
+        If the analysis isn't done by ``deadline`` (event loop time), raises
+        DLPTimeoutError, or with ``degrade`` falls back to static terms plus
+        regex-only detection and counts the text in ``stats["degraded"]``.
+        """
+        detector = detector or self.detector
+        key = self._cache_key(text, detector)
+        cached = self.cache.get(key)
+        if cached is None:
+            # Single-flight: identical concurrent calls share one analysis
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._plan(text, detector))
+                self._inflight[key] = task
+                task.add_done_callback(functools.partial(self._finish_inflight, key))
+            else:
+                COALESCED_TOTAL.inc()
+            # Shielded so one caller giving up doesn't cancel it for the others
+            # (and a timed-out analysis still lands in the cache)
+            if deadline is None:
+                cached = await asyncio.shield(task)
+            else:
+                cached = await self._await_within(task, text, deadline, degrade)
+
+        plan, stats = cached
+        return plan, {**stats, "pii_types": dict(stats["pii_types"])}
 
-        for term in terms:
-            new_kp.add_keyword(term, term)
+    async def _await_within(
+        self, task: asyncio.Future, text: str, deadline: float, degrade: bool
+    ) -> tuple[RedactionPlan, dict]:
+        timeout = max(deadline - asyncio.get_running_loop().time(), 0)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if not degrade:
+                raise DLPTimeoutError(
+                    f"ML analysis of {len(text)} chars exceeded the latency budget"
+                ) from None
+        return await asyncio.to_thread(self._plan_degraded, text)
+
+    def _plan_degraded(self, text: str) -> tuple[RedactionPlan, dict]:
+        """Static terms plus the pattern detector, run directly on the text
+        without the NLP pipeline or the ML queue."""
+        stats = empty_stats()
+        stats["degraded"] = 1
+        spans = [
+            (start, end, "STATIC_TERM")
+            for start, end, _ in self.static_matcher.find(text)
+        ]
+        stats["static_replacements"] = len(spans)
+
+        for start, end, entity_type in self.pattern_engine.find(text):
+            spans.append((start, end, entity_type))
+            stats["pattern_replacements"] += 1
+            stats["pii_types"][entity_type] = (
+                stats["pii_types"].get(entity_type, 0) + 1
+            )
+        return build_plan(spans), stats
+
+    def scan_inline(self, text: str) -> list[tuple[int, int, str]]:
+        """Static terms plus the pattern detector, synchronously: everything
+        that can run on a streamed body without waiting for the ML queue."""
+        spans = [
+            (start, end, "STATIC_TERM")
+            for start, end, _ in self.static_matcher.find(text)
+        ]
+        spans.extend(self.pattern_engine.find(text))
+        return spans
+
+    async def _analyze(self, text: str) -> list[tuple[int, int, str]]:
+        if not self.chunk_size or len(text) <= self.chunk_size:
+            return await self._submit(text)
+
+        chunks = split_chunks(text, self.chunk_size, self.chunk_overlap)
+        # Each chunk is costed with the chunks before it, so a large document
+        # is scheduled like a stream of chunk-sized jobs instead of a burst
+        results = await asyncio.gather(
+            *(
+                self._submit(chunk, cost=offset + len(chunk))
+                for offset, chunk in chunks
+            )
+        )
+        spans = [
+            (start + offset, end + offset, etype)
+            for (offset, _), chunk_spans in zip(chunks, results)
+            for start, end, etype in chunk_spans
+        ]
+        return dedupe_spans(spans)
+
+    async def _submit(
+        self, text: str, cost: int | None = None
+    ) -> list[tuple[int, int, str]]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        now = loop.time()
+        priority = now
+        if self.cost_rate:
+            priority += (len(text) if cost is None else cost) / self.cost_rate
+        await self.task_queue.put(
+            (priority, next(self._queue_seq), text, future, now)
+        )
+        self._maybe_scale_up(0.0)
+        return await future
+
+    def _needs_ml(self, text: str) -> bool:
+        if not self.prefilter:
+            return True
+        decision = prefilter_decision(text, self.min_length)
+        ML_PREFILTER_TOTAL.labels(decision=decision).inc()
+        return decision == "analyze"
 
-        self.keyword_processor = new_kp
+    async def redact_many(
+        self,
+        texts: list[str],
+        deadline: float | None = None,
+        degrade: bool = False,
+        detector: str | None = None,
+    ) -> tuple[list[str], dict]:
+        """Redact many strings concurrently (see plan_many)."""
+        plans, stats = await self.plan_many(texts, deadline, degrade, detector)
+        return [
+            apply_plan(text, plan, self.replacement_token)
+            for text, plan in zip(texts, plans)
+        ], stats
 
-    async def redact(self, text: str) -> tuple[str, dict]:
-        stats = {"static_replacements": 0, "ml_replacements": 0, "pii_types": {}}
+    async def plan_many(
+        self,
+        texts: list[str],
+        deadline: float | None = None,
+        degrade: bool = False,
+        detector: str | None = None,
+    ) -> tuple[list[RedactionPlan], dict]:
+        """Plan many strings concurrently (e.g. every string value of a JSON
+        document). They are queued together, so the ML workers batch them, and
+        the returned stats are merged across all strings."""
+        results = await asyncio.gather(
+            *(self.plan(text, deadline, degrade, detector) for text in texts)
+        )
+        stats = empty_stats()
+        for _, s in results:
+            merge_stats(stats, s)
+        return [plan for plan, _ in results], stats
+
+    def _finish_inflight(self, key: tuple, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        # Skip results computed against a term set that was swapped meanwhile
+        if key[0] == self.terms_version:
+            plan, stats = task.result()
+            self.cache.put(key, (plan, stats), _PLAN_BASE_SIZE + _SPAN_SIZE * len(plan))
+
+    async def _plan(
+        self, text: str, detector: str = "presidio"
+    ) -> tuple[RedactionPlan, dict]:
+        stats = empty_stats()
         spans = []
 
-        static_hits = self.keyword_processor.extract_keywords(text, span_info=True)
-        for keyword, start, end in static_hits:
+        for start, end, _ in self.static_matcher.find(text):
             spans.append((start, end, "STATIC_TERM"))
             stats["static_replacements"] += 1
 
-        if self.ml_enabled and self.analyzer:
-            future = asyncio.get_running_loop().create_future()
-            await self.task_queue.put((text, future))
-            ml_results = await future
+        if detector == "patterns":
+            pattern_results = self.pattern_engine.find(text)
 
-            stats["ml_replacements"] = len(ml_results)
-            for r in ml_results:
-                spans.append((r.start, r.end, r.entity_type))
-                stats["pii_types"][r.entity_type] = (
-                    stats["pii_types"].get(r.entity_type, 0) + 1
+            stats["pattern_replacements"] = len(pattern_results)
+            for start, end, entity_type in pattern_results:
+                spans.append((start, end, entity_type))
+                stats["pii_types"][entity_type] = (
+                    stats["pii_types"].get(entity_type, 0) + 1
                 )
+        elif self.ml_enabled and self.analyzer and self._needs_ml(text):
+            ml_results = await self._analyze(text)
 
-        if not spans:
-            return text, stats
-
-        spans.sort(key=lambda x: x[0])
-        merged_spans = []
-        current_start, current_end = -1, -1
-
-        for start, end, etype in spans:
-            if current_start == -1:
-                current_start, current_end = start, end
-            elif start <= current_end:
-                current_end = max(current_end, end)
-            else:
-                merged_spans.append((current_start, current_end))
-                current_start, current_end = start, end
-        if current_start != -1:
-            merged_spans.append((current_start, current_end))
-
-        res = list(text)
-        for start, end in reversed(merged_spans):
-            res[start:end] = list(self.replacement_token)
+            stats["ml_replacements"] = len(ml_results)
+            for start, end, entity_type in ml_results:
+                spans.append((start, end, entity_type))
+                stats["pii_types"][entity_type] = (
+                    stats["pii_types"].get(entity_type, 0) + 1
+                )
 
-        return "".join(res), stats
+        return build_plan(spans), stats
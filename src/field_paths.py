@@ -0,0 +1,112 @@
+import re
+from functools import lru_cache
+from typing import Optional, Union
+
+# Built-in field-path profiles for common LLM API request schemas: the fields
+# carrying user (or conversation) text. Everything else, such as model names,
+# roles, tool schemas and base64 image data, is not scanned.
+PROFILES = {
+    # Chat Completions, Completions, Embeddings, Moderations and Responses
+    "openai": [
+        "messages[*].content",
+        "messages[*].content[*].text",
+        "messages[*].tool_calls[*].function.arguments",
+        "prompt",
+        "prompt[*]",
+        "input",
+        "input[*]",
+        "input[*].content",
+        "input[*].content[*].text",
+        "instructions",
+    ],
+    # Messages and legacy Text Completions
+    "anthropic": [
+        "system",
+        "system[*].text",
+        "messages[*].content",
+        "messages[*].content[*].text",
+        "messages[*].content[*].content",
+        "messages[*].content[*].content[*].text",
+        "prompt",
+    ],
+}
+
+# One path segment: ".key" (the leading dot is optional on the first one),
+# "*" for any key, "[n]" for an array index or "[*]" for any index
+_SEGMENT_RE = re.compile(r"(?:^|\.)([^.\[\]]+)|\[(\*|\d+)\]")
+
+_ANY_KEY = "*"
+_ANY_INDEX = -1
+
+PathPart = Union[str, int]
+
+
+def parse_field_path(path: str) -> list[PathPart]:
+    """Split a field path such as ``messages[*].content`` into keys (str) and
+    array indices (int), with ``*`` for any key and -1 for any index."""
+    parts = []
+    pos = 0
+    while pos < len(path):
+        match = _SEGMENT_RE.match(path, pos)
+        if match is None:
+            raise ValueError(f"Invalid field path: {path!r}")
+        key, index = match.groups()
+        if key is not None:
+            parts.append(key)
+        else:
+            parts.append(_ANY_INDEX if index == "*" else int(index))
+        pos = match.end()
+    if not parts:
+        raise ValueError("Empty field path")
+    return parts
+
+
+class _Node:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: dict[PathPart, _Node] = {}
+        self.terminal = False
+
+
+class FieldSelector:
+    """A compiled set of field paths. Called with the path of a JSON value
+    (its keys and array indices from the root), it tells whether the value is
+    selected. The paths share a trie, so a lookup costs one step per level
+    whatever the number of paths."""
+
+    def __init__(self, paths: list[str]):
+        self.paths = list(paths)
+        self._root = _Node()
+        for path in self.paths:
+            node = self._root
+            for part in parse_field_path(path):
+                node = node.children.setdefault(part, _Node())
+            node.terminal = True
+
+    def __call__(self, path: tuple[PathPart, ...]) -> bool:
+        nodes = [self._root]
+        for part in path:
+            wildcard = _ANY_INDEX if isinstance(part, int) else _ANY_KEY
+            nodes = [
+                child
+                for node in nodes
+                for child in (node.children.get(part), node.children.get(wildcard))
+                if child is not None
+            ]
+            if not nodes:
+                return False
+        return any(node.terminal for node in nodes)
+
+
+@lru_cache(maxsize=64)
+def field_selector(
+    profile: Optional[str] = None, fields: tuple[str, ...] = ()
+) -> FieldSelector:
+    """The selector for a built-in profile plus extra field paths."""
+    paths = list(fields)
+    if profile is not None:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown field profile: {profile}")
+        paths = PROFILES[profile] + paths
+    return FieldSelector(paths)
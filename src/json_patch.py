@@ -0,0 +1,177 @@
+import json
+import re
+from typing import Callable, NamedTuple, Optional
+
+from .redaction import RedactionPlan, apply_plan
+
+# A JSON string token. Outside strings a valid document has no quotes, so a
+# left-to-right scan for this pattern finds exactly the document's strings.
+_STRING_RE = re.compile(r'"[^"\\\x00-\x1f]*(?:\\.[^"\\\x00-\x1f]*)*"')
+# One token of what a valid document can hold between two strings:
+# punctuation, a number or a literal, after optional whitespace
+_SCALAR = r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null"
+_TOKEN_RE = re.compile(r"[ \t\n\r]*(?:([\[\]{}:,])|(?:" + _SCALAR + "))")
+# Further elements of an array of numbers (e.g. embeddings), taken at once
+_SCALAR_RUN_RE = re.compile(r"(?:[ \t\n\r]*,[ \t\n\r]*(?:" + _SCALAR + "))+")
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+
+class JSONString(NamedTuple):
+    start: int  # offset of the opening quote
+    end: int  # offset just past the closing quote
+    value: str
+    escaped: bool
+
+
+def string_values(
+    text: str, select: Optional[Callable[[tuple], bool]] = None
+) -> Optional[list[JSONString]]:
+    """Locate every string value (object keys excluded) of a JSON document,
+    with its decoded value and its offsets in ``text``, without building the
+    document. Returns None when ``text`` isn't a single valid JSON value.
+
+    With ``select``, only the values whose path (keys and array indices from
+    the root) it accepts are returned; the others are not decoded either.
+
+    The whole grammar is checked, so all text outside the returned strings is
+    keys, punctuation, numbers or literals in valid positions.
+    """
+    values = []
+    pos = 0
+    grammar = _Grammar()
+    try:
+        for match in _STRING_RE.finditer(text):
+            grammar.between(text, pos, match.start())
+            start, pos = match.span()
+            raw = match.group()
+            if grammar.string():
+                if select is not None:
+                    grammar.path[-1] = _decode(raw)
+            elif select is None or select(tuple(grammar.path)):
+                values.append(JSONString(start, pos, _decode(raw), "\\" in raw))
+        grammar.between(text, pos, len(text))
+        grammar.finish()
+    except ValueError:
+        return None
+    return values
+
+
+def _decode(raw: str) -> str:
+    return json.loads(raw) if "\\" in raw else raw[1:-1]
+
+
+class _Grammar:
+    """Follows the tokens of a JSON document, raising ValueError at the first
+    one out of place. ``path`` holds the current key (None until decoded) or
+    index of each open container."""
+
+    def __init__(self):
+        self.path: list = []
+        self._stack: list[str] = []
+        # What may come next: "value", "value_or_close" (after "["), "key",
+        # "key_or_close" (after "{"), "colon", "comma_or_close" or "end"
+        self._expect = "value"
+
+    def between(self, text: str, start: int, end: int):
+        pos = start
+        while True:
+            if self._expect == "comma_or_close" and self._stack[-1] == "[":
+                run = _SCALAR_RUN_RE.match(text, pos, end)
+                if run is not None:
+                    self.path[-1] += run.group().count(",")
+                    pos = run.end()
+            match = _TOKEN_RE.match(text, pos, end)
+            if match is None:
+                break
+            pos = match.end()
+            self._token(match.group(1))
+        if _WHITESPACE_RE.match(text, pos, end).end() != end:
+            raise ValueError(f"Unexpected text at {pos}")
+
+    def _token(self, punctuation: Optional[str]):
+        # None for a number or literal
+        if punctuation is None:
+            self._value()
+        elif punctuation in "[{":
+            self._open(punctuation)
+        elif punctuation in "]}":
+            self._close(punctuation)
+        elif punctuation == ",":
+            self._comma()
+        elif self._expect == "colon":
+            self._expect = "value"
+        else:
+            raise ValueError("Unexpected ':'")
+
+    def string(self) -> bool:
+        """Consume a string; True when it is an object key."""
+        if self._expect in ("key", "key_or_close"):
+            self._expect = "colon"
+            return True
+        self._value()
+        return False
+
+    def finish(self):
+        if self._expect != "end":
+            raise ValueError("Incomplete document")
+
+    def _value(self):
+        if self._expect not in ("value", "value_or_close"):
+            raise ValueError("Unexpected value")
+        self._expect = "comma_or_close" if self._stack else "end"
+
+    def _open(self, bracket: str):
+        if self._expect not in ("value", "value_or_close"):
+            raise ValueError(f"Unexpected {bracket!r}")
+        self._stack.append(bracket)
+        if bracket == "{":
+            self.path.append(None)
+            self._expect = "key_or_close"
+        else:
+            self.path.append(0)
+            self._expect = "value_or_close"
+
+    def _close(self, bracket: str):
+        opening = "{" if bracket == "}" else "["
+        empty = "key_or_close" if bracket == "}" else "value_or_close"
+        if (
+            not self._stack
+            or self._stack[-1] != opening
+            or self._expect not in ("comma_or_close", empty)
+        ):
+            raise ValueError(f"Unexpected {bracket!r}")
+        self._stack.pop()
+        self.path.pop()
+        self._expect = "comma_or_close" if self._stack else "end"
+
+    def _comma(self):
+        if self._expect != "comma_or_close":
+            raise ValueError("Unexpected ','")
+        if self._stack[-1] == "[":
+            self.path[-1] += 1
+            self._expect = "value"
+        else:
+            self._expect = "key"
+
+
+def redaction_edits(
+    text: str, values: list[JSONString], plans: list[RedactionPlan], token: str
+) -> list[tuple[int, int, str]]:
+    """Turn per-string redaction plans into (start, end, replacement) edits of
+    ``text``. Spans in strings without escapes are patched in place; a string
+    with escapes is re-encoded whole, keeping \\u escapes if it used them."""
+    edits = []
+    token_is_literal = json.dumps(token, ensure_ascii=False)[1:-1] == token
+    for string, plan in zip(values, plans):
+        if not plan:
+            continue
+        if string.escaped or not token_is_literal:
+            redacted = apply_plan(string.value, plan, token)
+            ensure_ascii = text[string.start:string.end].isascii()
+            edits.append(
+                (string.start, string.end, json.dumps(redacted, ensure_ascii=ensure_ascii))
+            )
+        else:
+            offset = string.start + 1
+            edits.extend((offset + start, offset + end, token) for start, end, _ in plan)
+    return edits
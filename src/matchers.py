@@ -0,0 +1,268 @@
+import logging
+import os
+import re
+from typing import NamedTuple
+
+import ahocorasick
+import marisa_trie
+from flashtext import KeywordProcessor
+
+logger = logging.getLogger("dlp_proxy")
+
+# Optional inline flags in front of a term, e.g. "(?sc)ABCsecret":
+#   w = whole word, s = substring, c = case-sensitive, i = case-insensitive
+_FLAGS_RE = re.compile(r"^\(\?([wsci]+)\)")
+
+
+class StaticTerm(NamedTuple):
+    text: str
+    whole_word: bool
+    case_sensitive: bool
+
+
+def parse_term(
+    line: str, whole_word: bool = True, case_sensitive: bool = False
+) -> StaticTerm:
+    """Parse a term line, applying its inline flags over the given defaults."""
+    match = _FLAGS_RE.match(line)
+    if match:
+        for flag in match.group(1):
+            if flag in "ws":
+                whole_word = flag == "w"
+            else:
+                case_sensitive = flag == "c"
+        line = line[match.end():]
+    return StaticTerm(line, whole_word, case_sensitive)
+
+
+def terms_from_mapping(data: dict) -> list[str]:
+    """Flatten a KV secret (e.g. Vault's data dict) into a list of terms."""
+    terms = []
+    for value in data.values():
+        if isinstance(value, list):
+            terms.extend(str(v) for v in value)
+        else:
+            terms.append(str(value))
+    return terms
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _lower_preserving_offsets(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. "İ") grow when lowercased; keep those as-is
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class StaticMatcher:
+    """Finds static terms in text as (start, end, term) spans."""
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        raise NotImplementedError
+
+
+class FlashTextMatcher(StaticMatcher):
+    """FlashText backend. Matches on word boundaries only; substring terms are
+    matched as whole words."""
+
+    def __init__(self, terms: list[StaticTerm]):
+        self.insensitive = KeywordProcessor(case_sensitive=False)
+        self.sensitive = KeywordProcessor(case_sensitive=True)
+        substring_terms = 0
+        for term in terms:
+            substring_terms += not term.whole_word
+            processor = self.sensitive if term.case_sensitive else self.insensitive
+            processor.add_keyword(term.text, term.text)
+        if substring_terms:
+            logger.warning(
+                f"FlashText matcher ignores substring mode for {substring_terms} "
+                "terms; use the aho_corasick matcher to match inside tokens"
+            )
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        hits = self.insensitive.extract_keywords(text, span_info=True)
+        if len(self.sensitive):
+            hits += self.sensitive.extract_keywords(text, span_info=True)
+        return [(start, end, term) for term, start, end in hits]
+
+
+class AhoCorasickMatcher(StaticMatcher):
+    """Aho-Corasick automaton (pyahocorasick, implemented in C) supporting
+    per-term whole-word/substring and case-sensitivity modes."""
+
+    def __init__(self, terms: list[StaticTerm]):
+        self.sensitive = ahocorasick.Automaton()
+        self.insensitive = ahocorasick.Automaton()
+        for term in terms:
+            if not term.text:
+                continue
+            if term.case_sensitive:
+                self.sensitive.add_word(term.text, (len(term.text), term))
+            else:
+                key = term.text.lower()
+                self.insensitive.add_word(key, (len(key), term))
+        for automaton in (self.sensitive, self.insensitive):
+            if len(automaton):
+                automaton.make_automaton()
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        hits = []
+        if len(self.sensitive):
+            hits.extend(self._iter(self.sensitive, text, text))
+        if len(self.insensitive):
+            hits.extend(
+                self._iter(self.insensitive, _lower_preserving_offsets(text), text)
+            )
+        return _leftmost_longest(hits)
+
+    @staticmethod
+    def _iter(automaton, haystack: str, text: str):
+        n = len(text)
+        for last, (length, term) in automaton.iter(haystack):
+            start, end = last - length + 1, last + 1
+            if term.whole_word and (
+                (start > 0 and _is_word_char(text[start - 1]))
+                or (end < n and _is_word_char(text[end]))
+            ):
+                continue
+            yield start, end, term.text
+
+
+def _leftmost_longest(hits):
+    # Same non-overlapping selection FlashText makes
+    result = []
+    last_end = -1
+    for start, end, term in sorted(hits, key=lambda h: (h[0], h[0] - h[1])):
+        if start >= last_end:
+            result.append((start, end, term))
+            last_end = end
+    return result
+
+
+# Record layout of the compiled index: (flags, unused). The reserved _META_KEY
+# record holds (index-wide flags, longest key length) instead.
+_RECORD_FORMAT = "<BI"
+_META_KEY = "\U0010ffffmeta"
+_WHOLE_WORD = 1
+_CASE_SENSITIVE = 2
+_HAS_SUBSTRING = 4
+_NON_WORD_RE = re.compile(r"\W")
+
+
+class MarisaMatcher(StaticMatcher):
+    """Static terms in a compact marisa-trie index.
+
+    The index can be compiled once to a file (see ``compile_term_index``) and
+    loaded with mmap, so several proxy processes share the same pages instead
+    of each building a dict-of-dicts trie in memory.
+    """
+
+    def __init__(self, terms: list[StaticTerm] = (), trie=None):
+        if trie is None:
+            trie = _build_trie(terms)
+        self.trie = trie
+        self.term_count = max(len(trie) - 1, 0)
+        meta = trie.get(_META_KEY) or [(0, 0)]
+        index_flags, self.max_len = meta[0]
+        self.has_substring = bool(index_flags & _HAS_SUBSTRING)
+        self.has_case_sensitive = bool(index_flags & _CASE_SENSITIVE)
+
+    @classmethod
+    def load(cls, path: str) -> "MarisaMatcher":
+        trie = marisa_trie.RecordTrie(_RECORD_FORMAT)
+        trie.mmap(path)
+        return cls(trie=trie)
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        if not self.max_len:
+            return []
+        lowered = _lower_preserving_offsets(text)
+        if self.has_substring:
+            starts = range(len(text))
+        else:
+            # Whole-word terms can only start where the previous char isn't \w
+            starts = [0] + [m.end() for m in _NON_WORD_RE.finditer(text)]
+
+        hits = []
+        for start in starts:
+            self._match_at(lowered, text, start, False, hits)
+            if self.has_case_sensitive:
+                self._match_at(text, text, start, True, hits)
+        return _leftmost_longest(hits)
+
+    def _match_at(self, haystack, text, start, case_sensitive, hits):
+        n = len(text)
+        for key in self.trie.prefixes(haystack[start:start + self.max_len]):
+            if key == _META_KEY:
+                continue
+            end = start + len(key)
+            for flags, _ in self.trie[key]:
+                if bool(flags & _CASE_SENSITIVE) != case_sensitive:
+                    continue
+                if flags & _WHOLE_WORD and (
+                    (start > 0 and _is_word_char(text[start - 1]))
+                    or (end < n and _is_word_char(text[end]))
+                ):
+                    continue
+                hits.append((start, end, text[start:end]))
+
+
+def _build_trie(terms) -> marisa_trie.RecordTrie:
+    records = []
+    index_flags = max_len = 0
+    for term in terms:
+        if not term.text:
+            continue
+        key = term.text if term.case_sensitive else term.text.lower()
+        flags = (_WHOLE_WORD if term.whole_word else 0) | (
+            _CASE_SENSITIVE if term.case_sensitive else 0
+        )
+        index_flags |= flags & _CASE_SENSITIVE
+        if not term.whole_word:
+            index_flags |= _HAS_SUBSTRING
+        max_len = max(max_len, len(key))
+        records.append((key, (flags, 0)))
+    records.append((_META_KEY, (index_flags, max_len)))
+    return marisa_trie.RecordTrie(_RECORD_FORMAT, records)
+
+
+def compile_term_index(
+    lines: list[str],
+    path: str,
+    whole_word: bool = True,
+    case_sensitive: bool = False,
+) -> int:
+    """Compile term lines into an on-disk index for MarisaMatcher.load.
+
+    Returns the number of terms written.
+    """
+    terms = [parse_term(line, whole_word, case_sensitive) for line in lines]
+    trie = _build_trie(terms)
+    tmp_path = f"{path}.tmp"
+    trie.save(tmp_path)
+    # Replace atomically so running proxies never mmap a half-written file
+    os.replace(tmp_path, path)
+    return len(trie) - 1
+
+
+MATCHERS = {
+    "flashtext": FlashTextMatcher,
+    "aho_corasick": AhoCorasickMatcher,
+    "marisa": MarisaMatcher,
+}
+
+
+def build_matcher(
+    backend: str,
+    lines: list[str],
+    whole_word: bool = True,
+    case_sensitive: bool = False,
+) -> StaticMatcher:
+    if backend not in MATCHERS:
+        raise ValueError(f"Unknown static matcher backend: {backend}")
+    terms = [parse_term(line, whole_word, case_sensitive) for line in lines]
+    return MATCHERS[backend](terms)
@@ -0,0 +1,189 @@
+import ipaddress
+import re
+from typing import Callable, NamedTuple, Optional
+
+
+def luhn_valid(digits: str) -> bool:
+    """Luhn checksum, as used by payment card numbers."""
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        n = ord(char) - 48
+        if i % 2:
+            n = n * 2 - 9 if n > 4 else n * 2
+        total += n
+    return total % 10 == 0
+
+
+def _digits(candidate: str) -> str:
+    return "".join(c for c in candidate if c.isdigit())
+
+
+def _valid_credit_card(candidate: str) -> bool:
+    digits = _digits(candidate)
+    return 13 <= len(digits) <= 19 and luhn_valid(digits)
+
+
+def _valid_iban(candidate: str) -> bool:
+    iban = candidate.replace(" ", "").upper()
+    if not 15 <= len(iban) <= 34:
+        return False
+    # ISO 13616: move the country code and check digits to the end, map
+    # letters to 10..35 and the whole number must be 1 mod 97
+    rearranged = iban[4:] + iban[:4]
+    return int("".join(str(int(c, 36)) for c in rearranged)) % 97 == 1
+
+
+def _valid_ipv4(candidate: str) -> bool:
+    return all(int(octet) <= 255 for octet in candidate.split("."))
+
+
+def _valid_ipv6(candidate: str) -> bool:
+    if candidate == "::":
+        return False
+    try:
+        ipaddress.IPv6Address(candidate)
+    except ValueError:
+        return False
+    return True
+
+
+def _valid_us_ssn(candidate: str) -> bool:
+    area, group, serial = candidate.split("-")
+    return (
+        area not in ("000", "666")
+        and not area.startswith("9")
+        and group != "00"
+        and serial != "0000"
+    )
+
+
+def _valid_phone(candidate: str) -> bool:
+    return 10 <= len(_digits(candidate)) <= 15
+
+
+class EntityPattern(NamedTuple):
+    entity_type: str
+    regex: str
+    # Run on each candidate match; a rejected candidate is not reported
+    validator: Optional[Callable[[str], bool]] = None
+
+
+# Order matters where patterns can match at the same position: the first
+# alternative wins, and later ones are only tried there if it is rejected.
+# Patterns must not contain capturing groups, and every repetition is bounded
+# so a match never exceeds a few hundred characters (streamed bodies hold a
+# match back whole).
+PATTERNS = [
+    EntityPattern(
+        "API_KEY",
+        r"(?<![\w-])(?:"
+        r"(?:AKIA|ASIA)[0-9A-Z]{16}"  # AWS access key id
+        r"|gh[pousr]_[A-Za-z0-9]{36,251}"  # GitHub
+        r"|github_pat_[A-Za-z0-9_]{22,244}"
+        r"|sk-(?:proj-|ant-)?[A-Za-z0-9_-]{20,256}"  # OpenAI, Anthropic
+        r"|[rs]k_(?:live|test)_[A-Za-z0-9]{16,247}"  # Stripe
+        r"|xox[abposr]-[A-Za-z0-9-]{10,251}"  # Slack
+        r"|AIza[0-9A-Za-z_-]{35}"  # Google
+        r")(?![\w-])",
+    ),
+    EntityPattern(
+        "EMAIL_ADDRESS",
+        r"(?<![\w.%+-])[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,63}"
+        r"(?:\.[A-Za-z0-9-]{1,63}){0,8}\.[A-Za-z]{2,24}\b",
+    ),
+    EntityPattern(
+        "IBAN_CODE",
+        r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b",
+        _valid_iban,
+    ),
+    EntityPattern(
+        "CREDIT_CARD",
+        r"(?<![\d-])[3-6]\d{3}(?:[ -]?\d){9,15}(?![\d-])",
+        _valid_credit_card,
+    ),
+    EntityPattern(
+        "US_SSN",
+        r"(?<![\d-])\d{3}-\d{2}-\d{4}(?![\d-])",
+        _valid_us_ssn,
+    ),
+    EntityPattern(
+        "PHONE_NUMBER",
+        r"(?<![\w+])(?:"
+        r"(?:\+1[ .-]?)?(?:\(\d{3}\) ?|\d{3}[ .-])\d{3}[ .-]\d{4}"
+        r"|\+\d{1,3}(?:[ .-]?\d{2,4}){2,5}"
+        r")(?![\d-])",
+        _valid_phone,
+    ),
+    EntityPattern(
+        "IP_ADDRESS",
+        r"(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?!\.?\d)",
+        _valid_ipv4,
+    ),
+    EntityPattern(
+        "IP_ADDRESS",
+        r"(?<![\w:.])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?![\w:])",
+        _valid_ipv6,
+    ),
+]
+
+PATTERN_ENTITIES = sorted({p.entity_type for p in PATTERNS})
+
+
+class PatternEngine:
+    """Detects pattern-based entities (emails, phone numbers, card numbers,
+    IBANs, IPs, API keys) without NLP. All enabled patterns are compiled into
+    one alternation, so a string is scanned once however many are enabled;
+    checksum validators only run on the candidates it finds."""
+
+    def __init__(self, entities: list[str] | None = None):
+        self.patterns = [
+            p for p in PATTERNS if entities is None or p.entity_type in entities
+        ]
+        self.entities = sorted({p.entity_type for p in self.patterns})
+        self._compiled = [re.compile(p.regex) for p in self.patterns]
+        self._combined = (
+            re.compile(
+                "|".join(f"(?P<p{i}>{p.regex})" for i, p in enumerate(self.patterns))
+            )
+            if self.patterns
+            else None
+        )
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """Return (start, end, entity_type) for every match in text."""
+        if self._combined is None:
+            return []
+        spans = []
+        pos = 0
+        search = self._combined.search
+        while True:
+            match = search(text, pos)
+            if match is None:
+                return spans
+            start = match.start()
+            span = self._accept(match.lastindex - 1, match.group(), start)
+            if span is None:
+                span = self._retry_at(text, start, match.lastindex)
+            if span is None:
+                pos = start + 1
+            else:
+                spans.append(span)
+                pos = span[1]
+
+    def _accept(self, index: int, candidate: str, start: int):
+        pattern = self.patterns[index]
+        if pattern.validator and not pattern.validator(candidate):
+            return None
+        return (start, start + len(candidate), pattern.entity_type)
+
+    def _retry_at(self, text: str, start: int, after: int):
+        # The combined scan only reports the first alternative matching at a
+        # position; when that candidate fails validation, the later ones get
+        # their chance there (e.g. a non-Luhn digit run that is a phone number)
+        for index in range(after, len(self.patterns)):
+            match = self._compiled[index].match(text, start)
+            if match:
+                span = self._accept(index, match.group(), start)
+                if span:
+                    return span
+        return None
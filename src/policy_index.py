@@ -0,0 +1,75 @@
+from typing import NamedTuple, Optional
+
+from .config import HostDLPPolicy
+from .field_paths import field_selector
+
+
+class Route(NamedTuple):
+    key: str  # the dlp.hosts key, e.g. "*.example.com/v1/"
+    path_prefix: str
+    policy: HostDLPPolicy
+
+
+def parse_route_key(key: str) -> tuple[str, bool, str]:
+    """Split a dlp.hosts key into (host, is_wildcard, path_prefix).
+
+    ``api.example.com`` matches that host, ``*.example.com`` any subdomain of
+    example.com and ``*`` any host. A path prefix may follow, as in
+    ``api.example.com/v1/chat/``.
+    """
+    host, slash, path = key.partition("/")
+    host = host.lower().rstrip(".")
+    wildcard = host == "*" or host.startswith("*.")
+    if wildcard:
+        host = host[2:]
+    if not host and not wildcard or "*" in host:
+        raise ValueError(f"Invalid dlp.hosts key: {key!r}")
+    return host, wildcard, slash + path
+
+
+class PolicyIndex:
+    """The dlp.hosts policies, compiled for lookup by host and request path.
+
+    The most specific host wins: an exact host, then the longest wildcard
+    suffix, then ``*``. Among that host's routes the longest matching path
+    prefix wins; when none matches, less specific hosts are tried. A lookup
+    costs a dict probe per label of the host name, however many routes there
+    are.
+    """
+
+    def __init__(self, policies: dict[str, HostDLPPolicy]):
+        self._exact: dict[str, list[Route]] = {}
+        self._suffix: dict[str, list[Route]] = {}
+        for key, policy in policies.items():
+            host, wildcard, path_prefix = parse_route_key(key)
+            table = self._suffix if wildcard else self._exact
+            table.setdefault(host, []).append(Route(key, path_prefix, policy))
+            # Compile the field policies now, so a bad profile or field path
+            # fails at startup rather than on every request to that route
+            for rule in policy.json_fields:
+                field_selector(rule.profile, tuple(rule.fields))
+        for routes in (*self._exact.values(), *self._suffix.values()):
+            routes.sort(key=lambda route: len(route.path_prefix), reverse=True)
+
+    def lookup(self, host: str, path: str) -> Optional[Route]:
+        host = host.lower().rstrip(".")
+        route = self._match(self._exact.get(host), path)
+        if route is not None:
+            return route
+        dot = host.find(".")
+        while dot != -1:
+            route = self._match(self._suffix.get(host[dot + 1:]), path)
+            if route is not None:
+                return route
+            dot = host.find(".", dot + 1)
+        return self._match(self._suffix.get(""), path)
+
+    @staticmethod
+    def _match(routes: Optional[list[Route]], path: str) -> Optional[Route]:
+        if not routes:
+            return None
+        path = path.split("?", 1)[0]
+        for route in routes:
+            if path.startswith(route.path_prefix):
+                return route
+        return None
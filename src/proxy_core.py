@@ -1,11 +1,36 @@
+import asyncio
 import errno
 import logging
 import os
-from mitmproxy import http
-from src.dlp_engine import DLPEngine
-from src.config import config
-from prometheus_client import start_http_server, Counter, Histogram, Gauge
-from pythonjsonlogger import jsonlogger
+import time
+
+# Presidio and spaCy make the imports below a noticeable part of startup
+_IMPORT_START = time.perf_counter()
+from mitmproxy import http  # noqa: E402
+from mitmproxy.net.http.headers import infer_content_encoding  # noqa: E402
+from src.admission import AdmissionController, Rejection  # noqa: E402
+from src.dlp_engine import (  # noqa: E402
+    DLPEngine,
+    DLPTimeoutError,
+    STARTUP_SECONDS,
+    load_warmup_corpus,
+)
+from src.compression import (  # noqa: E402
+    SUPPORTED_ENCODINGS,
+    CompressedStreamRedactor,
+    DecompressionLimitExceeded,
+    measure_decoded,
+)
+from src.config import config  # noqa: E402
+from src.field_paths import field_selector  # noqa: E402
+from src.json_patch import redaction_edits, string_values  # noqa: E402
+from src.policy_index import PolicyIndex, Route  # noqa: E402
+from src.redaction import apply_edits, apply_edits_to_bytes, redacted_length  # noqa: E402
+from src.streaming import SSERedactor, StreamRedactor  # noqa: E402
+from prometheus_client import start_http_server, Counter, Histogram, Gauge  # noqa: E402
+from pythonjsonlogger import jsonlogger  # noqa: E402
+
+STARTUP_SECONDS.labels(stage="imports").set(time.perf_counter() - _IMPORT_START)
 
 # Configure JSON logging
 logger = logging.getLogger("dlp_proxy")
@@ -51,11 +76,71 @@ LATENCY = Histogram(
 ACTIVE_CONNECTIONS = Gauge(
     "dlp_active_connections", "Number of currently active connections"
 )
+LATENCY_BUDGET_EXCEEDED_TOTAL = Counter(
+    "dlp_latency_budget_exceeded_total",
+    "Requests whose ML analysis did not finish within dlp.latency_budget_ms",
+    ["host"],
+)
+DEGRADED_TOTAL = Counter(
+    "dlp_degraded_total",
+    "Requests redacted with static and regex-only detection after a timeout",
+    ["host"],
+)
+READY = Gauge("dlp_ready", "1 once models are loaded and warmed up, else 0")
+PASSTHROUGH_TOTAL = Counter(
+    "dlp_passthrough_total",
+    "Requests forwarded without buffering or scanning, by dlp.hosts route",
+    ["route"],
+)
+STREAMS_TOTAL = Counter(
+    "dlp_streams_total",
+    "Streamed request and response bodies, by whether they were scanned",
+    ["direction", "outcome"],
+)
+
+
+def _is_text(content_type: str) -> bool:
+    return "application/json" in content_type or "text/" in content_type
+
+
+def _reject_body(flow: http.HTTPFlow, request_id: str, status: int, reason: str):
+    logger.warning(
+        "Request rejected",
+        extra={
+            "request_id": request_id,
+            "size": len(flow.request.raw_content),
+            "reason": reason,
+        },
+    )
+    flow.response = http.Response.make(
+        status, reason.encode(), {"Content-Type": "text/plain"}
+    )
+
+
+def _can_scan_stream(message: http.Message) -> bool:
+    encoding = message.headers.get("Content-Encoding", "identity").lower()
+    if encoding == "identity":
+        return True
+    if encoding not in SUPPORTED_ENCODINGS:
+        return False
+    # Recompressing changes the length, and an HTTP/1.0 request can't switch
+    # to chunked framing
+    return not (
+        isinstance(message, http.Request)
+        and message.http_version == "HTTP/1.0"
+        and "Content-Length" in message.headers
+    )
 
 
 class DLPAddon:
     def __init__(self):
-        self.dlp_engine = DLPEngine()
+        # Models are loaded in the background once mitmproxy is running, so
+        # the proxy and metrics ports are bound straight away.
+        self.dlp_engine = DLPEngine(lazy=True)
+        self.ready = False
+        self.startup_task = None
+        self.admission = AdmissionController(config.proxy.admission)
+        self.policies = PolicyIndex(config.dlp.hosts)
 
         # Start Prometheus metrics server
         metrics_port = config.proxy.metrics_port
@@ -76,7 +161,83 @@ class DLPAddon:
         logger.info("DLP Engine initialized")
 
     def running(self):
-        self.dlp_engine.start_workers()
+        self._start()
+
+    def _start(self):
+        if self.startup_task is None:
+            self.startup_task = asyncio.create_task(self._startup())
+
+    async def _startup(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.dlp_engine.load
+            )
+            self.dlp_engine.start_workers()
+        except Exception as e:
+            logger.error(f"Failed to load DLP Engine: {e}")
+            return
+
+        if config.dlp.warmup_enabled:
+            try:
+                corpus = load_warmup_corpus(config.dlp.warmup_file)
+                count = await self.dlp_engine.warm_up(corpus)
+                logger.info(f"Warm-up analyzed {count} texts")
+            except Exception as e:
+                # A failed warm-up only costs latency, not correctness
+                logger.warning(f"Warm-up failed: {e}")
+
+        STARTUP_SECONDS.labels(stage="total").set(
+            time.perf_counter() - started
+        )
+        self.ready = True
+        READY.set(1)
+        logger.info("DLP Engine ready")
+
+    async def _wait_until_ready(self) -> bool:
+        self._start()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self.startup_task), config.proxy.startup_timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    async def requestheaders(self, flow: http.HTTPFlow):
+        route = self._route(flow)
+        if route is not None and route.policy.passthrough:
+            # Not for the DLP: forwarded as it arrives, never buffered
+            flow.request.stream = True
+            PASSTHROUGH_TOTAL.labels(route=route.key).inc()
+            return
+
+        # Bodies too large to buffer are scanned as they stream to the
+        # upstream, holding only a small window of each in memory
+        request = flow.request
+        if (
+            not config.proxy.stream_large_bodies
+            or request.method not in ("POST", "PUT", "PATCH")
+            or not _is_text(request.headers.get("Content-Type", ""))
+            or not _can_scan_stream(request)
+            or not self._too_large_to_buffer(flow)
+        ):
+            return
+        # Headers go upstream before the body is scanned, so the engine must
+        # be ready first: before load() there are no static terms to match
+        request_id = self._request_id(flow)
+        if not self.ready and not await self._wait_until_ready():
+            self._not_ready(flow, request_id)
+            return
+        # A streamed body holds only the carry window, so it takes a slot
+        # but no bytes
+        rejection = self.admission.admit(route, 0)
+        if rejection:
+            self._shed(flow, rejection, request_id)
+            return
+        flow.metadata["dlp_admitted"] = (route, 0)
+        STREAMS_TOTAL.labels(direction="request", outcome="scanned").inc()
+        request.stream = self._body_stream(request, "request")
 
     async def request(self, flow: http.HTTPFlow):
         # We can inspect request content here if we want to redact outgoing
@@ -87,49 +248,154 @@ class DLPAddon:
         # So we need to redact the REQUEST body.
 
         # Correlation ID
-        request_id = flow.request.headers.get("X-Request-ID")
-        if not request_id:
-            request_id = os.urandom(16).hex()
-            flow.request.headers["X-Request-ID"] = request_id
+        request_id = self._request_id(flow)
 
-        # Health Probe
-        if flow.request.path == "/_health" and flow.request.method == "GET":
-            is_healthy = True
-            # Check Vault (if used) - simplified check if engine is initialized
-            # In a real scenario, we might ping Vault here.
-            # Check Model
-            if not self.dlp_engine.analyzer:
-                is_healthy = False
+        if self._health_probe(flow):
+            return
 
-            if is_healthy:
-                flow.response = http.Response.make(
-                    200, b"OK", {"Content-Type": "text/plain"}
-                )
-            else:
-                flow.response = http.Response.make(
-                    503, b"Service Unavailable", {"Content-Type": "text/plain"}
-                )
+        if flow.metadata.get("dlp_rejected"):
+            # Answered in requestheaders, before the body arrived
             return
 
-        if flow.request.method in ["POST", "PUT", "PATCH"] and flow.request.content:
+        if flow.request.stream:
+            # Already scanned chunk by chunk on its way upstream
+            self._release_stream(flow)
+            self._log_stream(flow, flow.request.stream, "request")
+            return
+
+        if flow.request.method in ["POST", "PUT", "PATCH"] and flow.request.raw_content:
             content_type = flow.request.headers.get("Content-Type", "")
-            if "application/json" not in content_type and "text/" not in content_type:
+            if not _is_text(content_type):
                 return  # Skip binary or unsupported data
 
             # Request Buffering Limit
-            if len(flow.request.content) > 10 * 1024 * 1024:  # 10MB
-                logger.warning(
-                    "Request too large",
-                    extra={"request_id": request_id, "size": len(flow.request.content)},
+            size = self._body_size(flow, request_id)
+            if size is None:
+                return
+
+            # Shed load up front rather than queueing it without bound
+            route = self._route(flow)
+            rejection = self.admission.admit(
+                route, size, queue_full=self.dlp_engine.task_queue.full()
+            )
+            if rejection:
+                self._shed(flow, rejection, request_id)
+                return
+
+            try:
+                await self._inspect(flow, request_id)
+            finally:
+                self.admission.release(route, size)
+
+    def _too_large_to_buffer(self, flow: http.HTTPFlow) -> bool:
+        length = flow.request.headers.get("Content-Length")
+        if length is None:
+            # Chunked upload: its size is only known once it has all been
+            # buffered. Streaming it instead trades NER, JSON field selection
+            # and the route's detector for static terms and patterns, so
+            # that's opt-in; otherwise it's buffered and size-checked as a
+            # whole in the request hook.
+            return config.proxy.stream_unknown_length
+        return length.isdigit() and int(length) > self._max_body_size(flow)
+
+    def _health_probe(self, flow: http.HTTPFlow) -> bool:
+        # Health Probes: liveness only says the event loop is serving;
+        # readiness (also plain /_health) waits for models and warm-up.
+        if flow.request.method != "GET":
+            return False
+        if flow.request.path == "/_health/live":
+            flow.response = http.Response.make(
+                200, b"OK", {"Content-Type": "text/plain"}
+            )
+            return True
+
+        if flow.request.path in ("/_health", "/_health/ready"):
+            if self.ready:
+                flow.response = http.Response.make(
+                    200, b"OK", {"Content-Type": "text/plain"}
                 )
+            else:
                 flow.response = http.Response.make(
-                    413, b"Request Entity Too Large", {"Content-Type": "text/plain"}
+                    503, b"Service Unavailable", {"Content-Type": "text/plain"}
                 )
-                return
+            return True
+        return False
+
+    def _body_size(self, flow: http.HTTPFlow, request_id: str) -> int | None:
+        """Decoded size of a buffered body, or None after rejecting it. A
+        compressed body is measured by decoding it piece by piece, stopping
+        at max_body_size or max_decompression_ratio, before anything decodes
+        it whole."""
+        raw = flow.request.raw_content
+        max_body_size = self._max_body_size(flow)
+        encoding = flow.request.headers.get("Content-Encoding", "identity").lower()
+        if encoding == "identity":
+            size = len(raw)
+        elif encoding not in SUPPORTED_ENCODINGS:
+            return _reject_body(flow, request_id, 415, "Unsupported Content-Encoding")
+        else:
+            try:
+                size = measure_decoded(
+                    raw,
+                    encoding,
+                    "request",
+                    config.proxy.max_decompression_ratio,
+                    max_body_size + 1,
+                )
+            except DecompressionLimitExceeded:
+                size = max_body_size + 1
+            except ValueError:
+                return _reject_body(flow, request_id, 400, "Invalid Content-Encoding")
+        if size > max_body_size:
+            return _reject_body(flow, request_id, 413, "Request Entity Too Large")
+        return size
+
+    @staticmethod
+    def _request_id(flow: http.HTTPFlow) -> str:
+        request_id = flow.request.headers.get("X-Request-ID")
+        if not request_id:
+            request_id = os.urandom(16).hex()
+            flow.request.headers["X-Request-ID"] = request_id
+        return request_id
+
+    async def _inspect(self, flow: http.HTTPFlow, request_id: str):
+        # Never forward a body before the engine can inspect it
+        if not self.ready and not await self._wait_until_ready():
+            self._not_ready(flow, request_id)
+            return
 
-            # Await the process_request to ensure redaction happens BEFORE forwarding.
-            # This makes the proxy blocking for the duration of the analysis.
-            await self.process_request(flow)
+        # Await the process_request to ensure redaction happens BEFORE forwarding.
+        # This makes the proxy blocking for the duration of the analysis.
+        await self.process_request(flow)
+
+    @staticmethod
+    def _not_ready(flow: http.HTTPFlow, request_id: str):
+        logger.warning("DLP Engine not ready", extra={"request_id": request_id})
+        flow.metadata["dlp_rejected"] = True
+        flow.response = http.Response.make(
+            503,
+            b"Service Unavailable",
+            {"Content-Type": "text/plain", "Retry-After": "5"},
+        )
+
+    def _shed(self, flow: http.HTTPFlow, rejection: Rejection, request_id: str):
+        logger.warning(
+            "Request shed",
+            extra={
+                "request_id": request_id,
+                "host": flow.request.host,
+                "reason": rejection.reason,
+            },
+        )
+        flow.metadata["dlp_rejected"] = True
+        flow.response = http.Response.make(
+            rejection.status_code,
+            b'{"error": {"message": "DLP proxy overloaded, retry later", "code": "dlp_overloaded"}}',
+            {
+                "Content-Type": "application/json",
+                "Retry-After": str(rejection.retry_after),
+            },
+        )
 
     async def process_request(self, flow: http.HTTPFlow):  # noqa: C901
         request_id = flow.request.headers.get("X-Request-ID", "unknown")
@@ -142,61 +408,31 @@ class DLPAddon:
                 return
 
             content_type = flow.request.headers.get("Content-Type", "")
+            options = self._analysis_options(flow)
 
             with LATENCY.time():
+                # redacted_len is None when the body was left unchanged
                 if "application/json" in content_type:
-                    import json
-
-                    try:
-                        data = json.loads(content_str)
-                        merged_stats = {
-                            "static_replacements": 0,
-                            "ml_replacements": 0,
-                            "pii_types": {},
-                        }
-
-                        async def traverse_and_redact(obj):
-                            if isinstance(obj, dict):
-                                for k, v in obj.items():
-                                    obj[k] = await traverse_and_redact(v)
-                            elif isinstance(obj, list):
-                                for i, v in enumerate(obj):
-                                    obj[i] = await traverse_and_redact(v)
-                            elif isinstance(obj, str):
-                                # Only redact string values, preserving structure and NLP context!
-                                red_str, s = await self.dlp_engine.redact(obj)
-                                merged_stats["static_replacements"] += s[
-                                    "static_replacements"
-                                ]
-                                merged_stats["ml_replacements"] += s["ml_replacements"]
-                                for pii, count in s["pii_types"].items():
-                                    merged_stats["pii_types"][pii] = (
-                                        merged_stats["pii_types"].get(pii, 0) + count
-                                    )
-                                return red_str
-                            return obj
-
-                        redacted_data = await traverse_and_redact(data)
-                        redacted_content = json.dumps(redacted_data, ensure_ascii=False)
-                        stats = merged_stats
-                    except json.JSONDecodeError:
-                        # Fallback for malformed JSON
-                        redacted_content, stats = await self.dlp_engine.redact(
-                            content_str
-                        )
+                    redacted_len, stats = await self._redact_json_body(
+                        flow, content_str, options
+                    )
                 else:
-                    redacted_content, stats = await self.dlp_engine.redact(content_str)
+                    redacted_len, stats = await self._redact_text_body(
+                        flow, content_str, options
+                    )
+
+                if stats.get("degraded"):
+                    self._mark_degraded(flow, request_id)
 
                 # Token Usage Estimation (Input)
                 input_tokens = len(content_str) / 4
                 TOKEN_USAGE_TOTAL.labels(direction="input").inc(input_tokens)
 
-                if redacted_content != content_str:
-                    flow.request.set_text(redacted_content)
+                if redacted_len is not None:
                     REDACTED_TOTAL.inc()
 
                     # Token Usage Estimation (Output - if changed)
-                    output_tokens = len(redacted_content) / 4
+                    output_tokens = redacted_len / 4
                     TOKEN_USAGE_TOTAL.labels(direction="output").inc(output_tokens)
 
                     # PII Metrics
@@ -217,6 +453,8 @@ class DLPAddon:
                     # No redaction, output tokens = input tokens
                     TOKEN_USAGE_TOTAL.labels(direction="output").inc(input_tokens)
         except Exception as e:
+            if isinstance(e, DLPTimeoutError):
+                LATENCY_BUDGET_EXCEEDED_TOTAL.labels(host=self._route_label(flow)).inc()
             logger.error(
                 "Error redacting request",
                 extra={"error": str(e), "request_id": request_id},
@@ -232,11 +470,245 @@ class DLPAddon:
 
             ACTIVE_CONNECTIONS.dec()
 
+    def _route(self, flow: http.HTTPFlow) -> Route | None:
+        """The dlp.hosts route for this request, looked up once per flow."""
+        if "dlp_route" not in flow.metadata:
+            flow.metadata["dlp_route"] = self.policies.lookup(
+                flow.request.host, flow.request.path
+            )
+        return flow.metadata["dlp_route"]
+
+    def _route_label(self, flow: http.HTTPFlow) -> str:
+        # Metric label for a request: its dlp.hosts key, never the
+        # client-supplied Host header, so the label set stays bounded
+        route = self._route(flow)
+        return route.key if route is not None else "other"
+
+    def _max_body_size(self, flow: http.HTTPFlow) -> int:
+        route = self._route(flow)
+        if route is not None and route.policy.max_body_size is not None:
+            return route.policy.max_body_size
+        return config.proxy.max_body_size
+
+    def _analysis_options(self, flow: http.HTTPFlow) -> dict:
+        """Engine keyword arguments for this request: the route's detector
+        (dlp.hosts) and the deadline enforcing its latency budget."""
+        options = {}
+        route = self._route(flow)
+        policy = route.policy if route is not None else None
+        if policy and policy.detector:
+            options["detector"] = policy.detector
+        budget_ms = config.dlp.latency_budget_ms
+        if policy and policy.latency_budget_ms is not None:
+            budget_ms = policy.latency_budget_ms
+        if budget_ms > 0:
+            loop = asyncio.get_running_loop()
+            options["deadline"] = loop.time() + budget_ms / 1000
+            options["degrade"] = config.dlp.latency_policy == "degrade"
+        return options
+
+    def _json_fields(self, flow: http.HTTPFlow):
+        """The field selector for this request's JSON body: the route's
+        json_fields rule with the longest matching path prefix, or None to
+        scan every string."""
+        route = self._route(flow)
+        if route is None:
+            return None
+        path = flow.request.path.split("?", 1)[0]
+        rules = [r for r in route.policy.json_fields if path.startswith(r.path_prefix)]
+        if not rules:
+            return None
+        rule = max(rules, key=lambda r: len(r.path_prefix))
+        return field_selector(rule.profile, tuple(rule.fields))
+
+    def _mark_degraded(self, flow: http.HTTPFlow, request_id: str):
+        label = self._route_label(flow)
+        LATENCY_BUDGET_EXCEEDED_TOTAL.labels(host=label).inc()
+        DEGRADED_TOTAL.labels(host=label).inc()
+        flow.metadata["dlp_degraded"] = True
+        logger.warning(
+            "ML analysis exceeded the latency budget, used regex-only detection",
+            extra={"request_id": request_id, "host": flow.request.host},
+        )
+
+    async def _redact_json_body(
+        self, flow: http.HTTPFlow, content_str: str, options: dict
+    ):
+        # Only string values are redacted, preserving structure and NLP
+        # context, and only those a field policy selects when the host has
+        # one. They are located in place and all go to the engine in one
+        # call, so they are analyzed concurrently; the body is then patched
+        # where a string changed, never re-serialized.
+        values = string_values(content_str, self._json_fields(flow))
+        if values is None:
+            # Fallback for malformed JSON
+            return await self._redact_text_body(flow, content_str, options)
+
+        plans, stats = await self.dlp_engine.plan_many(
+            [string.value for string in values], **options
+        )
+        token = self.dlp_engine.replacement_token
+        edits = redaction_edits(content_str, values, plans, token)
+        if not edits:
+            return None, stats
+        self._write_edits(flow, content_str, edits)
+        return len(content_str) + sum(
+            len(replacement) - (end - start) for start, end, replacement in edits
+        ), stats
+
+    async def _redact_text_body(
+        self, flow: http.HTTPFlow, content_str: str, options: dict
+    ):
+        plan, stats = await self.dlp_engine.plan(content_str, **options)
+        if not plan:
+            return None, stats
+
+        token = self.dlp_engine.replacement_token
+        self._write_edits(
+            flow, content_str, [(start, end, token) for start, end, _ in plan]
+        )
+        return redacted_length(len(content_str), plan, token), stats
+
+    @staticmethod
+    def _write_edits(
+        flow: http.HTTPFlow, content_str: str, edits: list[tuple[int, int, str]]
+    ):
+        patched = None
+        if "content-encoding" not in flow.request.headers:
+            # Splice the replacements into the original bytes instead of
+            # set_text() re-encoding the whole body
+            raw = flow.request.raw_content
+            encoding = infer_content_encoding(
+                flow.request.headers.get("Content-Type", ""), raw
+            )
+            patched = apply_edits_to_bytes(raw, content_str, edits, encoding)
+
+        if patched is not None:
+            flow.request.content = patched
+        else:
+            flow.request.set_text(apply_edits(content_str, edits))
+
+    def responseheaders(self, flow: http.HTTPFlow):
+        request_stream = flow.request.stream
+        if isinstance(request_stream, CompressedStreamRedactor) and request_stream.error:
+            # The upload was cut short; don't pass the upstream's answer to it
+            # back as if it had been received whole
+            flow.kill()
+            return
+        route = self._route(flow)
+        if route is not None and route.policy.passthrough:
+            # Forwarded as it arrives, never buffered
+            flow.response.stream = True
+            return
+        # Streamed completions are scanned as they pass through rather than
+        # buffered, which would hold back every token until the last one
+        if not config.dlp.response_scan or not self._is_streamed(flow.response):
+            return
+        if not _can_scan_stream(flow.response):
+            encoding = flow.response.headers.get("Content-Encoding")
+            STREAMS_TOTAL.labels(direction="response", outcome="skipped_encoded").inc()
+            logger.warning(
+                "Streamed response not scanned: unsupported content encoding",
+                extra={"url": flow.request.pretty_url, "encoding": encoding},
+            )
+            return
+        STREAMS_TOTAL.labels(direction="response", outcome="scanned").inc()
+        flow.response.stream = self._body_stream(flow.response, "response")
+
+    def _body_stream(self, message: http.Message, direction: str):
+        encoding = message.headers.get("Content-Encoding", "identity").lower()
+        events = "text/event-stream" in message.headers.get("Content-Type", "")
+        if encoding == "identity":
+            return self._stream_redactor(
+                preserve_length="Content-Length" in message.headers, events=events
+            )
+        # Compressed bodies are decoded, scanned and recompressed piece by
+        # piece. The new length isn't known when the headers go out.
+        if "Content-Length" in message.headers:
+            del message.headers["Content-Length"]
+            if message.http_version == "HTTP/1.1":
+                message.headers["Transfer-Encoding"] = "chunked"
+        return CompressedStreamRedactor(
+            self._stream_redactor(preserve_length=False, events=events),
+            encoding,
+            direction,
+            config.proxy.max_decompression_ratio,
+        )
+
+    def _stream_redactor(
+        self, preserve_length: bool, events: bool = False
+    ) -> StreamRedactor | SSERedactor:
+        if events and not preserve_length:
+            # Scanned across events, so an entity streamed one token per
+            # event is still matched
+            return SSERedactor(
+                self.dlp_engine.scan_inline,
+                self.dlp_engine.replacement_token,
+                config.dlp.stream_carry_chars,
+            )
+        # Redaction changes the body's length unless it is masked in place,
+        # which keeps a Content-Length that was sent ahead valid
+        return StreamRedactor(
+            self.dlp_engine.scan_inline,
+            self.dlp_engine.replacement_token,
+            config.dlp.stream_carry_chars,
+            preserve_length=preserve_length,
+        )
+
+    @staticmethod
+    def _is_streamed(response: http.Response) -> bool:
+        content_type = response.headers.get("Content-Type", "")
+        if "text/event-stream" in content_type:
+            return True
+        chunked = "chunked" in response.headers.get("Transfer-Encoding", "").lower()
+        return chunked and _is_text(content_type)
+
     def response(self, flow: http.HTTPFlow):
-        pass
+        # Called once a streamed body has been fully passed through
+        self._release_stream(flow)
+        self._log_stream(flow, flow.response.stream, "response")
+
+    def error(self, flow: http.HTTPFlow):
+        # A streamed upload that never completed still holds its slot
+        self._release_stream(flow)
+
+    def _release_stream(self, flow: http.HTTPFlow):
+        admitted = flow.metadata.pop("dlp_admitted", None)
+        if admitted is not None:
+            self.admission.release(*admitted)
+
+    @staticmethod
+    def _log_stream(flow: http.HTTPFlow, redactor, direction: str):
+        if isinstance(redactor, CompressedStreamRedactor) and redactor.error:
+            STREAMS_TOTAL.labels(direction=direction, outcome="aborted").inc()
+            logger.warning(
+                f"Streamed {direction} aborted",
+                extra={
+                    "url": flow.request.pretty_url,
+                    "reason": redactor.error,
+                    "request_id": flow.request.headers.get("X-Request-ID", "unknown"),
+                },
+            )
+        if (
+            isinstance(
+                redactor, (StreamRedactor, SSERedactor, CompressedStreamRedactor)
+            )
+            and redactor.pii_types
+        ):
+            logger.info(
+                f"Redacted {direction} stream",
+                extra={
+                    "url": flow.request.pretty_url,
+                    "pii_types": redactor.pii_types,
+                    "request_id": flow.request.headers.get("X-Request-ID", "unknown"),
+                },
+            )
 
     def done(self):
         logger.info("Shutting down DLP Proxy...")
+        if self.startup_task:
+            self.startup_task.cancel()
+        self.dlp_engine.shutdown()
 
 
 addons = [DLPAddon()]
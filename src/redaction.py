@@ -0,0 +1,91 @@
+import codecs
+from typing import Optional
+
+# (start, end, entity_types) with sorted, non-overlapping character offsets
+RedactionPlan = list[tuple[int, int, tuple[str, ...]]]
+
+# Codecs where one character is one byte, so character offsets are byte offsets
+_SINGLE_BYTE_CODECS = {"ascii", "iso8859-1", "cp1252"}
+
+
+def build_plan(spans) -> RedactionPlan:
+    """Sort (start, end, entity_type) spans and merge overlapping ones,
+    keeping every entity type that contributed to a merged span."""
+    plan = []
+    for start, end, etype in sorted(spans, key=lambda s: s[0]):
+        if plan and start <= plan[-1][1]:
+            prev_start, prev_end, types = plan[-1]
+            if etype not in types:
+                types = types + (etype,)
+            plan[-1] = (prev_start, max(prev_end, end), types)
+        else:
+            plan.append((start, end, (etype,)))
+    return plan
+
+
+def apply_plan(text: str, plan: RedactionPlan, token: str) -> str:
+    """Build the redacted text in one pass over the untouched slices."""
+    if not plan:
+        return text
+    parts = []
+    prev = 0
+    for start, end, _ in plan:
+        parts.append(text[prev:start])
+        parts.append(token)
+        prev = end
+    parts.append(text[prev:])
+    return "".join(parts)
+
+
+def redacted_length(length: int, plan: RedactionPlan, token: str) -> int:
+    return length + sum(len(token) - (end - start) for start, end, _ in plan)
+
+
+def apply_edits(text: str, edits: list[tuple[int, int, str]]) -> str:
+    """Replace sorted, non-overlapping (start, end, replacement) ranges."""
+    parts = []
+    prev = 0
+    for start, end, replacement in edits:
+        parts.append(text[prev:start])
+        parts.append(replacement)
+        prev = end
+    parts.append(text[prev:])
+    return "".join(parts)
+
+
+def apply_edits_to_bytes(
+    raw: bytes, text: str, edits: list[tuple[int, int, str]], encoding: str
+) -> Optional[bytes]:
+    """apply_edits() on the original encoded body, given the text it decodes
+    to, patching it directly.
+
+    Only the segments between edits are measured, never the whole body
+    re-encoded. Returns None when the encoding doesn't allow mapping
+    character offsets to byte offsets, or can't represent a replacement.
+    """
+    try:
+        codec = codecs.lookup(encoding).name
+        replacements = [replacement.encode(codec) for _, _, replacement in edits]
+    except (LookupError, UnicodeEncodeError):
+        return None
+
+    if codec in _SINGLE_BYTE_CODECS or (codec == "utf-8" and len(raw) == len(text)):
+        to_bytes = None
+    elif codec == "utf-8":
+        to_bytes = codec
+    else:
+        return None
+
+    parts = []
+    prev_char = prev_byte = 0
+    for (start, end, _), replacement in zip(edits, replacements):
+        if to_bytes is None:
+            byte_start, byte_end = start, end
+        else:
+            byte_start = prev_byte + len(text[prev_char:start].encode(to_bytes))
+            byte_end = byte_start + len(text[start:end].encode(to_bytes))
+        parts.append(raw[prev_byte:byte_start])
+        parts.append(replacement)
+        prev_char, prev_byte = end, byte_end
+    parts.append(raw[prev_byte:])
+    return b"".join(parts)
@@ -0,0 +1,321 @@
+import codecs
+import json
+import re
+import time
+from typing import Callable, NamedTuple
+
+from prometheus_client import Counter, Histogram
+
+from .field_paths import field_selector
+from .json_patch import string_values
+from .redaction import RedactionPlan, apply_edits, apply_plan, build_plan
+
+STREAM_CHUNK_SECONDS = Histogram(
+    "dlp_stream_chunk_seconds",
+    "Time spent scanning each chunk of a streamed body",
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1],
+)
+STREAM_HELD_CHARS = Histogram(
+    "dlp_stream_held_chars",
+    "Characters held back after each chunk of a streamed body "
+    "(the carry-over window, delayed until the next chunk)",
+    buckets=[0, 16, 64, 128, 256, 512, 1024, 4096],
+)
+STREAM_PII_DETECTED_TOTAL = Counter(
+    "dlp_stream_pii_detected_total",
+    "Entities redacted from streamed bodies",
+    ["type"],
+)
+
+_WHITESPACE = (" ", "\n", "\t")
+
+# Fields of streamed LLM API events carrying a piece of generated text:
+# OpenAI Chat Completions, Completions and Responses, Anthropic Messages and
+# Text Completions, and Gemini
+DELTA_FIELDS = (
+    "choices[*].delta.content",
+    "choices[*].delta.tool_calls[*].function.arguments",
+    "choices[*].text",
+    "delta",
+    "delta.text",
+    "delta.partial_json",
+    "completion",
+    "candidates[*].content.parts[*].text",
+)
+_EVENT_END_RE = re.compile(r"\r\n\r\n|\n\n|\r\r")
+_DATA_RE = re.compile(r"^data: ?([^\r\n]*)", re.MULTILINE)
+# Event text held back at most, waiting for an event to end or for the text
+# after a held event to reach the carry window
+MAX_HELD_EVENT_CHARS = 1024 * 1024
+
+
+class StreamRedactor:
+    """Redacts a streamed body chunk by chunk, as a mitmproxy stream callable
+    (``flow.request.stream`` / ``flow.response.stream``).
+
+    The last ``carry_chars`` characters of each chunk are held back and scanned
+    again with the next one, so anything shorter than the window that is
+    split across chunks is still caught. A match running into the window is
+    held back whole. Everything is released when the stream ends (b"").
+
+    Memory per flow stays bounded: besides the chunk being scanned, at most
+    about two windows plus one match are held.
+
+    With ``preserve_length`` each match is replaced by a mask of the same byte
+    length, so a Content-Length sent ahead of the body stays valid.
+    """
+
+    def __init__(
+        self,
+        find: Callable[[str], list[tuple[int, int, str]]],
+        token: str,
+        carry_chars: int = 256,
+        preserve_length: bool = False,
+    ):
+        self.find = find
+        self.token = token
+        self.carry_chars = carry_chars
+        self.preserve_length = preserve_length
+        # surrogateescape keeps undecodable bytes intact through the round trip
+        self._decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+        self._pending = ""
+        self.pii_types: dict[str, int] = {}
+
+    def __call__(self, data: bytes) -> list[bytes]:
+        started = time.perf_counter()
+        final = not data
+        self._pending += self._decoder.decode(data, final=final)
+        text = self._pending
+
+        plan = build_plan(self.find(text)) if text else []
+        cut = len(text) if final else _safe_cut(text, plan, self.carry_chars)
+        emitted = [span for span in plan if span[1] <= cut]
+        for _, _, types in emitted:
+            for entity_type in types:
+                self.pii_types[entity_type] = self.pii_types.get(entity_type, 0) + 1
+                STREAM_PII_DETECTED_TOTAL.labels(type=entity_type).inc()
+        self._pending = text[cut:]
+
+        STREAM_CHUNK_SECONDS.observe(time.perf_counter() - started)
+        STREAM_HELD_CHARS.observe(len(self._pending))
+        if self.preserve_length:
+            out = _apply_masked(text[:cut], emitted, self.token)
+        else:
+            out = apply_plan(text[:cut], emitted, self.token).encode(
+                "utf-8", "surrogateescape"
+            )
+        # mitmproxy sends an empty bytes chunk as is, which in chunked HTTP/1
+        # would end the body early
+        return [out] if out else []
+
+
+def _safe_cut(text: str, plan: RedactionPlan, carry_chars: int) -> int:
+    """Where to stop releasing ``text``: about ``carry_chars`` before its end,
+    never inside a plan span."""
+    cut = len(text) - carry_chars
+    if cut <= 0:
+        return 0
+    # Cut after whitespace, so the held-back text starts on a word
+    # boundary and isn't matched as if a word began there
+    floor = max(cut - carry_chars, 0)
+    space = max(text.rfind(char, floor, cut) for char in _WHITESPACE)
+    if space >= 0:
+        cut = space + 1
+    # Plan spans are merged, so at most one straddles the cut
+    for start, end, _ in plan:
+        if start < cut < end:
+            return start
+    return cut
+
+
+def _apply_masked(text: str, plan: list, token: str) -> bytes:
+    """Like apply_plan, but each span becomes the token padded with "*" to the
+    span's encoded length (or only "*" when the token doesn't fit)."""
+    parts = []
+    prev = 0
+    for start, end, _ in plan:
+        parts.append(text[prev:start].encode("utf-8", "surrogateescape"))
+        size = len(text[start:end].encode("utf-8", "surrogateescape"))
+        mask = token.ljust(size, "*") if len(token) <= size else "*" * size
+        parts.append(mask.encode("ascii", "replace"))
+        prev = end
+    parts.append(text[prev:].encode("utf-8", "surrogateescape"))
+    return b"".join(parts)
+
+
+class _Segment(NamedTuple):
+    start: int  # offsets in the event's text
+    end: int
+    value: str  # the text it carries, decoded
+    json: bool  # a JSON string, re-encoded when redacted
+
+
+class _HeldEvent(NamedTuple):
+    text: str
+    segments: list[_Segment]
+    offsets: list[int]  # where each segment starts in the carried text
+    end: int  # where the event's text ends in the carried text
+
+
+class SSERedactor:
+    """Redacts a ``text/event-stream`` body event by event, as a mitmproxy
+    stream callable.
+
+    LLM APIs stream their output one token per event, so an entity is usually
+    split across several ``data:`` JSON events. The text pieces of the events
+    (DELTA_FIELDS, or the whole ``data:`` line when it isn't JSON) are joined
+    and scanned as one text, holding back the events whose text is within
+    ``carry_chars`` of the end, as StreamRedactor does for raw bytes. A
+    match is mapped back into the events it spans: the first one gets the
+    token and the others lose their part of it, and their JSON is re-encoded.
+    Anything else in an event is scanned within that event.
+
+    An event is only released whole, after the events before it. A body that
+    holds more than MAX_HELD_EVENT_CHARS without ending an event isn't an
+    event stream after all, and the rest of it goes through a StreamRedactor.
+    """
+
+    def __init__(
+        self,
+        find: Callable[[str], list[tuple[int, int, str]]],
+        token: str,
+        carry_chars: int = 256,
+    ):
+        self.find = find
+        self.token = token
+        self.carry_chars = carry_chars
+        self._decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+        self._partial = ""
+        self._held: list[_HeldEvent] = []
+        self._held_chars = 0
+        self._text = ""
+        self._raw: StreamRedactor | None = None
+        self._delta = field_selector(None, DELTA_FIELDS)
+        self.pii_types: dict[str, int] = {}
+
+    def __call__(self, data: bytes) -> list[bytes]:
+        if self._raw is not None:
+            return self._raw(data)
+        started = time.perf_counter()
+        final = not data
+        self._partial += self._decoder.decode(data, final=final)
+        pos = 0
+        for match in _EVENT_END_RE.finditer(self._partial):
+            self._hold(self._partial[pos:match.end()])
+            pos = match.end()
+        self._partial = self._partial[pos:]
+        if final and self._partial:
+            self._hold(self._partial)
+            self._partial = ""
+
+        force = final or self._held_chars > MAX_HELD_EVENT_CHARS
+        out = self._release(force).encode("utf-8", "surrogateescape")
+        STREAM_CHUNK_SECONDS.observe(time.perf_counter() - started)
+        STREAM_HELD_CHARS.observe(len(self._text))
+        if len(self._partial) > MAX_HELD_EVENT_CHARS:
+            self._raw = StreamRedactor(self.find, self.token, self.carry_chars)
+            self._raw.pii_types = self.pii_types
+            out += b"".join(
+                self._raw(self._partial.encode("utf-8", "surrogateescape"))
+            )
+            self._partial = ""
+        # As with StreamRedactor, never hand mitmproxy an empty chunk
+        return [out] if out else []
+
+    def _hold(self, text: str):
+        segments = self._segments(text)
+        offsets = []
+        for segment in segments:
+            offsets.append(len(self._text))
+            self._text += segment.value
+        self._held.append(_HeldEvent(text, segments, offsets, len(self._text)))
+        self._held_chars += len(text)
+
+    def _segments(self, text: str) -> list[_Segment]:
+        lines = list(_DATA_RE.finditer(text))
+        if len(lines) != 1:
+            # No data, or data split over several lines: scanned on its own
+            return []
+        data = lines[0].group(1)
+        offset = lines[0].start(1)
+        values = string_values(data, self._delta)
+        if values is None:
+            return [_Segment(offset, offset + len(data), data, False)]
+        return [
+            _Segment(offset + value.start, offset + value.end, value.value, True)
+            for value in values
+        ]
+
+    def _release(self, force: bool) -> str:
+        text = self._text
+        plan = build_plan(self.find(text)) if text else []
+        cut = len(text) if force else _safe_cut(text, plan, self.carry_chars)
+        count = 0
+        while count < len(self._held) and self._held[count].end <= cut:
+            count += 1
+        # Don't split a match between released and held events
+        boundary = self._held[count - 1].end if count else 0
+        for start, end, _ in reversed(plan):
+            if start < boundary < end:
+                while count and self._held[count - 1].end > start:
+                    count -= 1
+                boundary = self._held[count - 1].end if count else 0
+        if not count:
+            return ""
+
+        spans = [span for span in plan if span[1] <= boundary]
+        self._count(spans)
+        out = "".join(self._redact(event, spans) for event in self._held[:count])
+        self._held = [
+            _HeldEvent(
+                event.text,
+                event.segments,
+                [offset - boundary for offset in event.offsets],
+                event.end - boundary,
+            )
+            for event in self._held[count:]
+        ]
+        self._held_chars = sum(len(event.text) for event in self._held)
+        self._text = text[boundary:]
+        return out
+
+    def _redact(self, event: _HeldEvent, spans: RedactionPlan) -> str:
+        edits = []
+        for segment, offset in zip(event.segments, event.offsets):
+            value = self._redact_segment(segment.value, offset, spans)
+            if value != segment.value:
+                if segment.json:
+                    value = json.dumps(value, ensure_ascii=False)
+                edits.append((segment.start, segment.end, value))
+        # The rest of the event (ids, other fields, comments) on its own
+        local = [
+            span
+            for span in build_plan(self.find(event.text))
+            if not any(
+                span[0] < segment.end and segment.start < span[1]
+                for segment in event.segments
+            )
+        ]
+        self._count(local)
+        edits.extend((start, end, self.token) for start, end, _ in local)
+        return apply_edits(event.text, sorted(edits))
+
+    def _redact_segment(self, value: str, offset: int, spans: RedactionPlan) -> str:
+        end = offset + len(value)
+        edits = [
+            # The token goes where the match starts; later pieces are dropped
+            (
+                max(start, offset) - offset,
+                min(stop, end) - offset,
+                self.token if start >= offset else "",
+            )
+            for start, stop, _ in spans
+            if start < end and stop > offset
+        ]
+        return apply_edits(value, edits) if edits else value
+
+    def _count(self, spans: RedactionPlan):
+        for _, _, types in spans:
+            for entity_type in types:
+                self.pii_types[entity_type] = self.pii_types.get(entity_type, 0) + 1
+                STREAM_PII_DETECTED_TOTAL.labels(type=entity_type).inc()
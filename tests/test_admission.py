@@ -0,0 +1,86 @@
+from prometheus_client import REGISTRY
+
+from src.admission import AdmissionController
+from src.config import AdmissionConfig, HostAdmissionPolicy, HostDLPPolicy
+from src.policy_index import PolicyIndex, Route
+
+
+def _route(key: str, **admission) -> Route:
+    policy = HostAdmissionPolicy(**admission) if admission else None
+    return Route(key, "", HostDLPPolicy(admission=policy))
+
+
+def test_global_inflight_limit_sheds_with_503():
+    controller = AdmissionController(AdmissionConfig(max_inflight=2, retry_after=3))
+    assert controller.admit(None, 10) is None
+    assert controller.admit(None, 10) is None
+
+    rejection = controller.admit(None, 10)
+    assert rejection == (503, 3, "inflight")
+
+    controller.release(None, 10)
+    assert controller.admit(None, 10) is None
+
+
+def test_inflight_bytes_limit_admits_one_oversized_body():
+    controller = AdmissionController(AdmissionConfig(max_inflight_bytes=100))
+    assert controller.admit(None, 500) is None
+    assert controller.admit(None, 1).reason == "bytes"
+    controller.release(None, 500)
+    assert controller.admit(None, 60) is None
+    assert controller.admit(None, 60).reason == "bytes"
+
+
+def test_full_queue_sheds():
+    controller = AdmissionController(AdmissionConfig())
+    assert controller.admit(None, 1, queue_full=True).reason == "queue_full"
+    assert controller.inflight == 0
+
+
+def test_route_policy_answers_429_without_affecting_other_routes():
+    controller = AdmissionController(AdmissionConfig())
+    openai = _route("api.openai.com", max_inflight=1, retry_after=7)
+    assert controller.admit(openai, 1) is None
+    assert controller.admit(openai, 1) == (429, 7, "host_inflight")
+    assert controller.admit(_route("api.anthropic.com"), 1) is None
+    assert controller.admit(None, 1) is None
+
+
+def test_wildcard_route_limit_is_shared_by_its_hosts():
+    index = PolicyIndex(
+        {
+            "*.example.com": HostDLPPolicy(
+                admission=HostAdmissionPolicy(max_inflight=1)
+            )
+        }
+    )
+    controller = AdmissionController(AdmissionConfig())
+    first = index.lookup("a.example.com", "/")
+    assert controller.admit(first, 1) is None
+    assert controller.admit(index.lookup("b.example.com", "/"), 1).reason == (
+        "host_inflight"
+    )
+    controller.release(first, 1)
+    assert controller.admit(index.lookup("b.example.com", "/"), 1) is None
+
+
+def test_shed_metric_labels_requests_without_a_route_as_other():
+    controller = AdmissionController(AdmissionConfig(max_inflight=1))
+
+    def shed(labels):
+        return REGISTRY.get_sample_value("dlp_shed_total", labels) or 0
+
+    other = {"reason": "inflight", "host": "other"}
+    routed = {"reason": "inflight", "host": "api.openai.com"}
+    before_other, before_routed = shed(other), shed(routed)
+    assert controller.admit(_route("api.openai.com", max_inflight=5), 1) is None
+    assert controller.admit(None, 1).reason == "inflight"
+    assert controller.admit(_route("api.openai.com"), 1).reason == "inflight"
+    assert shed(other) == before_other + 1
+    assert shed(routed) == before_routed + 1
+
+
+def test_disabled_admission_admits_everything():
+    controller = AdmissionController(AdmissionConfig(enabled=False, max_inflight=0))
+    assert controller.admit(None, 1, queue_full=True) is None
+    controller.release(None, 1)
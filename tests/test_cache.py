@@ -0,0 +1,37 @@
+from src.cache import RedactionCache
+
+
+def test_cache_hit_and_miss():
+    cache = RedactionCache(max_entries=10, max_bytes=1024 * 1024)
+    assert cache.get("a") is None
+    cache.put("a", ("redacted", {}), 100)
+    assert cache.get("a") == ("redacted", {})
+
+
+def test_cache_evicts_least_recently_used():
+    cache = RedactionCache(max_entries=2, max_bytes=1024 * 1024)
+    cache.put("a", ("a", {}), 100)
+    cache.put("b", ("b", {}), 100)
+    cache.get("a")
+    cache.put("c", ("c", {}), 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert len(cache) == 2
+
+
+def test_cache_respects_byte_bound():
+    cache = RedactionCache(max_entries=100, max_bytes=200)
+    for key in range(5):
+        cache.put(key, ("x", {}), 100)
+    assert len(cache) == 2
+
+    cache.put("huge", ("x", {}), 10000)
+    assert cache.get("huge") is None
+
+
+def test_cache_disabled():
+    cache = RedactionCache(max_entries=0, max_bytes=1024)
+    cache.put("a", ("a", {}), 1)
+    assert cache.get("a") is None
@@ -1,8 +1,10 @@
+import json
 import yaml
 from unittest.mock import patch, MagicMock
 from typer.testing import CliRunner
 
 from src.cli import app
+from src.matchers import MarisaMatcher
 
 runner = CliRunner()
 
@@ -120,3 +122,43 @@ def test_add_term_empty_config():
         result = runner.invoke(app, ["add-term", "term1"])
         assert result.exit_code == 0
         assert "Added 'term1'" in result.output
+
+
+def test_compile_terms_from_file():
+    with runner.isolated_filesystem():
+        with open("terms.txt", "w") as f:
+            f.write("alpha\n(?s)beta\n\n")
+
+        result = runner.invoke(app, ["compile-terms", "--output", "terms.idx"])
+        assert result.exit_code == 0
+        assert "Compiled 2 terms" in result.output
+
+        matcher = MarisaMatcher.load("terms.idx")
+        assert matcher.find("alpha xbetax") == [(0, 5, "alpha"), (7, 11, "beta")]
+
+
+def test_compile_terms_from_vault_export():
+    with runner.isolated_filesystem():
+        with open("export.json", "w") as f:
+            json.dump({"data": {"data": {"a": "one", "b": ["two", "three"]}}}, f)
+
+        result = runner.invoke(
+            app, ["compile-terms", "--source", "export.json", "--output", "v.idx"]
+        )
+        assert result.exit_code == 0
+        assert "Compiled 3 terms" in result.output
+
+
+def test_compile_terms_missing_source():
+    with runner.isolated_filesystem():
+        result = runner.invoke(app, ["compile-terms", "--source", "nope.txt"])
+        assert result.exit_code == 1
+
+
+def test_pipeline_report_lists_pruned_recognizers():
+    with patch("src.cli.config.dlp.entities", ["EMAIL_ADDRESS"]):
+        result = runner.invoke(app, ["pipeline-report", "--repeat", "1"])
+    assert result.exit_code == 0
+    assert "Entities: EMAIL_ADDRESS" in result.output
+    assert "CreditCardRecognizer" in result.output
+    assert "Per call:" in result.output
@@ -0,0 +1,117 @@
+import gzip
+import zlib
+
+import brotli
+import pytest
+import zstandard
+
+from src.compression import (
+    PIECE_SIZE,
+    CompressedStreamRedactor,
+    DecompressionLimitExceeded,
+    StreamDecoder,
+    measure_decoded,
+)
+from src.streaming import StreamRedactor
+
+COMPRESS = {
+    "gzip": gzip.compress,
+    "deflate": zlib.compress,
+    "br": brotli.compress,
+    "zstd": zstandard.ZstdCompressor().compress,
+}
+DECOMPRESS = {
+    "gzip": gzip.decompress,
+    "deflate": zlib.decompress,
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+TEXT = b"".join(b"line %d: write to jane@example.com\n" % i for i in range(20000))
+
+
+def find_jane(text):
+    start = text.find("jane")
+    spans = []
+    while start != -1:
+        spans.append((start, start + 4, "PERSON"))
+        start = text.find("jane", start + 4)
+    return spans
+
+
+@pytest.mark.parametrize("encoding", sorted(COMPRESS))
+def test_decoder_emits_bounded_pieces(encoding):
+    raw = COMPRESS[encoding](TEXT)
+    pieces = []
+    decoder = StreamDecoder(encoding, "request")
+    for i in range(0, len(raw), 1000):
+        decoder.feed(raw[i:i + 1000], pieces.append)
+    assert b"".join(pieces) == TEXT
+    assert max(len(piece) for piece in pieces) <= PIECE_SIZE
+    assert (decoder.compressed, decoder.decompressed) == (len(raw), len(TEXT))
+
+
+@pytest.mark.parametrize("encoding", sorted(COMPRESS))
+def test_compressed_stream_redactor_round_trip(encoding):
+    raw = COMPRESS[encoding](TEXT)
+    redactor = CompressedStreamRedactor(
+        StreamRedactor(find_jane, "[X]", carry_chars=16), encoding, "response"
+    )
+    out = []
+    for i in range(0, len(raw), 700):
+        out.extend(redactor(raw[i:i + 700]))
+    out.extend(redactor(b""))
+    assert all(out)
+    assert DECOMPRESS[encoding](b"".join(out)) == TEXT.replace(b"jane", b"[X]")
+    assert redactor.pii_types == {"PERSON": 20000}
+
+
+def test_each_chunk_is_decodable_on_arrival():
+    # Streamed completions must not be held back by the compressor
+    redactor = CompressedStreamRedactor(
+        StreamRedactor(find_jane, "[X]", carry_chars=0), "gzip", "response"
+    )
+    raw = gzip.compress(b"data: hello\n\n")
+    out = b"".join(redactor(raw[:-8]))
+    assert zlib.decompressobj(wbits=31).decompress(out) == b"data: hello\n\n"
+
+
+@pytest.mark.parametrize("encoding", sorted(COMPRESS))
+def test_ratio_limit(encoding):
+    bomb = COMPRESS[encoding](b"\0" * (8 * 1024 * 1024))
+    with pytest.raises(DecompressionLimitExceeded):
+        measure_decoded(bomb, encoding, "request", max_ratio=100, max_size=0)
+    # Small bodies are allowed a higher ratio
+    small = COMPRESS[encoding](b"\0" * 100000)
+    assert measure_decoded(small, encoding, "request", 100, 0) == 100000
+
+
+def test_size_limit_and_invalid_bodies():
+    raw = gzip.compress(TEXT)
+    with pytest.raises(DecompressionLimitExceeded):
+        measure_decoded(raw, "gzip", "request", 0, max_size=len(TEXT) - 1)
+    assert measure_decoded(raw + gzip.compress(b"!"), "gzip", "request", 0, 0) == (
+        len(TEXT) + 1
+    )
+    raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    body = raw_deflate.compress(TEXT) + raw_deflate.flush()
+    assert measure_decoded(body, "deflate", "request", 0, 0) == len(TEXT)
+    with pytest.raises(ValueError):
+        measure_decoded(b"not gzip", "gzip", "request", 0, 0)
+    with pytest.raises(ValueError):
+        StreamDecoder("compress", "request")
+
+
+def test_stream_stops_at_the_ratio_limit():
+    bomb = gzip.compress(b"a" * (8 * 1024 * 1024))
+    redactor = CompressedStreamRedactor(
+        StreamRedactor(find_jane, "[X]"), "gzip", "request", max_ratio=100
+    )
+    out = []
+    for i in range(0, len(bomb), 1000):
+        out.extend(redactor(bomb[i:i + 1000]))
+    assert redactor.error == "gzip body expands past 100x"
+    assert redactor(b"") == []
+    # Forwarded data stops short of the end of the gzip stream
+    with pytest.raises(EOFError):
+        gzip.decompress(b"".join(out))
@@ -0,0 +1,49 @@
+import pytest
+from pydantic import ValidationError
+
+from src.config import AppConfig, DLPConfig
+
+
+@pytest.mark.parametrize(
+    "field",
+    [
+        "static_matcher",
+        "static_match_mode",
+        "ml_scheduling",
+        "ml_backend",
+        "latency_policy",
+        "detector",
+    ],
+)
+def test_enum_settings_reject_unknown_values(field):
+    with pytest.raises(ValidationError):
+        DLPConfig(**{field: "bogus"})
+
+
+def test_host_detector_rejects_unknown_values():
+    with pytest.raises(ValidationError):
+        AppConfig(dlp={"hosts": {"api.example.com": {"detector": "regex"}}})
+
+
+def test_enum_settings_accept_known_values():
+    config = DLPConfig(
+        static_matcher="aho_corasick",
+        static_match_mode="substring",
+        ml_scheduling="fifo",
+        ml_backend="process",
+        latency_policy="degrade",
+        detector="patterns",
+    )
+    assert config.detector == "patterns"
+
+
+@pytest.mark.parametrize(
+    "size, overlap", [(1000, 1000), (1000, 5000), (1000, -1), (-1, 0)]
+)
+def test_chunk_overlap_must_be_smaller_than_chunk_size(size, overlap):
+    with pytest.raises(ValidationError):
+        DLPConfig(ml_chunk_size=size, ml_chunk_overlap=overlap)
+
+
+def test_chunk_overlap_ignored_when_chunking_disabled():
+    assert DLPConfig(ml_chunk_size=0, ml_chunk_overlap=200).ml_chunk_overlap == 200
@@ -1,5 +1,20 @@
+import asyncio
+import os
+import signal
+import threading
+import time
 import pytest
-from src.dlp_engine import DLPEngine
+from unittest.mock import patch
+from src.config import config
+from src.dlp_engine import (
+    DLPEngine,
+    DLPTimeoutError,
+    build_analyzer,
+    dedupe_spans,
+    pipeline_exclusions,
+    prefilter_decision,
+    split_chunks,
+)
 
 import pytest_asyncio
 
@@ -37,3 +52,353 @@ async def test_no_redaction_needed(dlp_engine):
     assert redacted == text
     assert stats["static_replacements"] == 0
     assert stats["ml_replacements"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lazy_engine_loads_and_warms_up():
+    engine = DLPEngine(lazy=True)
+    assert not engine.loaded and engine.analyzer is None
+
+    engine.load()
+    engine.start_workers()
+    try:
+        analyzed = await engine.warm_up(["Call me at 415-555-0199."])
+        # Once per worker, and nothing left behind in the cache
+        assert analyzed == len(engine.workers)
+        assert len(engine.cache) == 0
+    finally:
+        engine.shutdown()
+
+
+def test_pipeline_exclusions_drop_ner_only_when_unused():
+    with patch("src.dlp_engine._ner_entities", return_value={"PERSON", "LOCATION"}):
+        assert pipeline_exclusions("model", None) == ["parser", "senter"]
+        assert "ner" not in pipeline_exclusions("model", ["PERSON", "PHONE_NUMBER"])
+        assert "ner" in pipeline_exclusions("model", ["PHONE_NUMBER", "EMAIL_ADDRESS"])
+
+
+def test_pruned_analyzer_keeps_only_needed_recognizers():
+    analyzer = build_analyzer(config.dlp.nlp_model, ["PHONE_NUMBER", "EMAIL_ADDRESS"])
+    for recognizer in analyzer.analyzer_engine.registry.recognizers:
+        assert {"PHONE_NUMBER", "EMAIL_ADDRESS"} & set(recognizer.supported_entities)
+
+    results = list(
+        analyzer.analyze_iterator(["mail a@b.com or call 415-555-0199"], language="en")
+    )
+    assert {r.entity_type for r in results[0]} == {"EMAIL_ADDRESS", "PHONE_NUMBER"}
+
+
+@pytest.mark.asyncio
+async def test_ml_worker_batches_queued_texts(dlp_engine):
+    batch_sizes = []
+    analyze_batch = dlp_engine._analyze_batch
+
+    def spy(texts):
+        batch_sizes.append(len(texts))
+        return analyze_batch(texts)
+
+    dlp_engine._analyze_batch = spy
+    texts = [f"Message {i}: call me at 415-555-0199." for i in range(8)]
+    results = await asyncio.gather(*(dlp_engine.redact(t) for t in texts))
+
+    for redacted, stats in results:
+        assert "415-555-0199" not in redacted
+        assert stats["ml_replacements"] > 0
+    assert sum(batch_sizes) == len(texts)
+    assert len(batch_sizes) < len(texts)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_grows_under_load_and_shrinks_when_idle():
+    with patch.multiple(
+        config.dlp,
+        ml_workers_min=1,
+        ml_workers_max=3,
+        ml_batch_size=2,
+        ml_scale_up_wait_ms=10,
+        ml_worker_idle_timeout=0.2,
+    ):
+        engine = DLPEngine()
+    analyze_batch = engine._analyze_batch
+
+    def slow(texts):
+        time.sleep(0.05)
+        return analyze_batch(texts)
+
+    engine._analyze_batch = slow
+    engine.start_workers()
+    try:
+        assert len(engine.workers) == 1
+        texts = [f"Ticket {i}: call me at 415-555-0199." for i in range(12)]
+        results = await asyncio.gather(*(engine.redact(t) for t in texts))
+        assert all("415-555-0199" not in redacted for redacted, _ in results)
+        assert len(engine.workers) == 3
+
+        await asyncio.sleep(0.5)
+        assert len(engine.workers) == 1
+        assert engine.busy_workers == 0
+    finally:
+        engine.shutdown()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scheduling", ["sjf", "fifo"])
+async def test_short_texts_overtake_queued_large_one(scheduling):
+    with patch.multiple(
+        config.dlp,
+        ml_workers_max=1,
+        ml_batch_size=1,
+        ml_scheduling=scheduling,
+        cache_max_entries=0,
+    ):
+        engine = DLPEngine()
+    analyze_batch = engine._analyze_batch
+    gate = threading.Event()
+    order = []
+
+    def spy(texts):
+        if not order:
+            gate.wait(5)
+        order.extend(texts)
+        return analyze_batch(texts)
+
+    engine._analyze_batch = spy
+    engine.start_workers()
+    try:
+        blocker = asyncio.create_task(engine.redact("Warm-up call from Jane Doe."))
+        await asyncio.sleep(0.05)
+        large = "Call Jane Doe at 415-555-0199 about the renewal. " * 100
+        tasks = [asyncio.create_task(engine.redact(large))]
+        await asyncio.sleep(0.01)
+        smalls = [f"Ticket {i}: call me at 415-555-0199." for i in range(5)]
+        tasks += [asyncio.create_task(engine.redact(text)) for text in smalls]
+        await asyncio.sleep(0.05)
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+        if scheduling == "sjf":
+            assert order[1:] == smalls + [large]
+        else:
+            assert order[1:] == [large] + smalls
+    finally:
+        gate.set()
+        engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pattern_detector_skips_the_ml_queue(dlp_engine):
+    async def no_ml(text, cost=None):
+        raise AssertionError("pattern detector must not queue ML work")
+
+    dlp_engine._submit = no_ml
+    text = "Mail jane@example.com, card 4111 1111 1111 1111, ping 10.0.0.12."
+    redacted, stats = await dlp_engine.redact(text, detector="patterns")
+    assert redacted == "Mail [REDACTED], card [REDACTED], ping [REDACTED]."
+    assert stats["pattern_replacements"] == 3
+    assert stats["ml_replacements"] == 0
+    assert stats["pii_types"] == {
+        "EMAIL_ADDRESS": 1,
+        "CREDIT_CARD": 1,
+        "IP_ADDRESS": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_latency_budget_fails_closed_or_degrades(dlp_engine):
+    analyze_batch = dlp_engine._analyze_batch
+
+    def stuck(texts):
+        time.sleep(0.3)
+        return analyze_batch(texts)
+
+    dlp_engine._analyze_batch = stuck
+    loop = asyncio.get_running_loop()
+
+    with pytest.raises(DLPTimeoutError):
+        await dlp_engine.plan("my password, call 415-555-0199", loop.time() + 0.05)
+
+    text = "the secret is on card 4111 1111 1111 1111, 415-555-0123 or mail a@b.com"
+    redacted, stats = await dlp_engine.redact(text, loop.time() + 0.05, degrade=True)
+    assert stats["degraded"] == 1
+    assert stats["pattern_replacements"] == 3
+    assert stats["ml_replacements"] == 0
+    assert "secret" not in redacted
+    assert "4111 1111 1111 1111" not in redacted
+    assert "415-555-0123" not in redacted
+    assert "a@b.com" not in redacted
+
+    # The real analysis keeps running and serves the next request from cache
+    await asyncio.gather(*list(dlp_engine._inflight.values()))
+    await asyncio.sleep(0)
+    _, stats = await dlp_engine.redact(text, loop.time() + 0.05, degrade=True)
+    assert stats["degraded"] == 0
+
+
+@pytest.mark.asyncio
+async def test_process_backend_restarts_crashed_worker():
+    with patch.object(config.dlp, "ml_backend", "process"), patch.object(
+        config.dlp, "ml_processes", 1
+    ):
+        engine = DLPEngine()
+    engine.start_workers()
+    try:
+        redacted, stats = await engine.redact("Call me at 415-555-0199.")
+        assert "415-555-0199" not in redacted
+
+        for pid in list(engine.process_pool._processes):
+            os.kill(pid, signal.SIGKILL)
+
+        redacted, stats = await engine.redact("Call me at 415-555-0199.")
+        assert "415-555-0199" not in redacted
+        assert stats["ml_replacements"] > 0
+    finally:
+        engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_redact_serves_repeated_text_from_cache(dlp_engine):
+    calls = []
+    run_batch = dlp_engine._run_batch
+
+    async def spy(texts):
+        calls.append(texts)
+        return await run_batch(texts)
+
+    dlp_engine._run_batch = spy
+    text = "My password is 415-555-0199."
+    first = await dlp_engine.redact(text)
+    second = await dlp_engine.redact(text)
+    assert first == second
+    assert len(calls) == 1
+
+    # Reloading an unchanged term set keeps the cache warm
+    dlp_engine.reload_config()
+    assert await dlp_engine.redact(text) == first
+    assert len(calls) == 1
+
+    with patch.object(dlp_engine, "_load_terms", return_value=["password", "new"]):
+        dlp_engine.reload_config()
+    third = await dlp_engine.redact(text)
+    assert third == first
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_redactions_are_coalesced(dlp_engine):
+    calls = []
+    run_batch = dlp_engine._run_batch
+
+    async def spy(texts):
+        calls.extend(texts)
+        return await run_batch(texts)
+
+    dlp_engine._run_batch = spy
+    text = "Call me at 415-555-0199."
+    results = await asyncio.gather(*(dlp_engine.redact(text) for _ in range(5)))
+
+    assert calls == [text]
+    assert all(result == results[0] for result in results)
+    assert "415-555-0199" not in results[0][0]
+    assert not dlp_engine._inflight
+
+
+@pytest.mark.asyncio
+async def test_redact_many_merges_stats(dlp_engine):
+    texts = ["my password", "Call me at 415-555-0199.", "Hello world."]
+    redacted, stats = await dlp_engine.redact_many(texts)
+
+    assert redacted[0] == "my [REDACTED]"
+    assert "415-555-0199" not in redacted[1]
+    assert redacted[2] == "Hello world."
+    assert stats["static_replacements"] == 1
+    assert stats["ml_replacements"] >= 1
+    assert sum(stats["pii_types"].values()) == stats["ml_replacements"]
+
+
+def test_prefilter_decision():
+    assert prefilter_decision("ok", 3) == "short"
+    assert prefilter_decision("assistant", 3) == "token"
+    assert prefilter_decision("gpt-4o", 3) == "token"
+    assert prefilter_decision("0.7", 3) == "token"
+    assert prefilter_decision("4111111111111111", 3) == "analyze"
+    assert prefilter_decision("John Smith", 3) == "analyze"
+    assert prefilter_decision("mail me at a@b.io", 3) == "analyze"
+
+
+@pytest.mark.asyncio
+async def test_prefilter_skips_ml_unless_forced(dlp_engine):
+    calls = []
+    run_batch = dlp_engine._run_batch
+
+    async def spy(texts):
+        calls.extend(texts)
+        return await run_batch(texts)
+
+    dlp_engine._run_batch = spy
+    await dlp_engine.redact_many(["assistant", "gpt-4o", "Call me at 415-555-0199."])
+    assert calls == ["Call me at 415-555-0199."]
+
+    dlp_engine.prefilter = False
+    await dlp_engine.redact("user")
+    assert calls[-1] == "user"
+
+
+def test_split_chunks_prefers_boundaries_and_overlaps():
+    text = " ".join(f"Sentence number {i} ends here." for i in range(50))
+    chunks = split_chunks(text, size=200, overlap=40)
+
+    assert len(chunks) > 1
+    assert chunks[0][0] == 0
+    assert chunks[-1][0] + len(chunks[-1][1]) == len(text)
+    for (offset, chunk), (next_offset, _) in zip(chunks, chunks[1:]):
+        assert text[offset:offset + len(chunk)] == chunk
+        assert len(chunk) <= 200
+        assert chunk.endswith(". ")
+        assert next_offset < offset + len(chunk)
+
+
+def test_dedupe_spans_removes_overlap_duplicates():
+    spans = [(10, 20, "PERSON"), (10, 20, "PERSON"), (12, 20, "PERSON"), (15, 25, "PHONE")]
+    assert dedupe_spans(spans) == [(10, 20, "PERSON"), (15, 25, "PHONE")]
+
+
+@pytest.mark.asyncio
+async def test_chunked_analysis_matches_whole_document(dlp_engine):
+    text = " ".join(
+        f"Line {i}: please call 415-555-0199 tomorrow." if i % 7 == 0 else f"Filler sentence {i}."
+        for i in range(120)
+    )
+    dlp_engine.chunk_size = 0
+    whole = await dlp_engine._analyze(text)
+
+    dlp_engine.chunk_size = 300
+    dlp_engine.chunk_overlap = 60
+    chunked = await dlp_engine._analyze(text)
+
+    assert whole
+    assert chunked == sorted(whole, key=lambda s: (s[0], -s[1]))
+
+
+@pytest.mark.asyncio
+async def test_terms_file_is_hot_reloaded(tmp_path):
+    terms_file = tmp_path / "terms.txt"
+    terms_file.write_text("alpha\n")
+    with patch.object(config.dlp, "static_terms_file", str(terms_file)), patch.object(
+        config.dlp, "ml_enabled", False
+    ), patch.object(config.dlp, "terms_watch_interval", 0.02):
+        engine = DLPEngine()
+        engine.start_workers()
+        try:
+            assert (await engine.redact("alpha beta"))[0] == "[REDACTED] beta"
+            version = engine.terms_version
+
+            terms_file.write_text("alpha\nbeta\n")
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if engine.terms_version != version:
+                    break
+
+            assert engine.terms_version == version + 1
+            assert (await engine.redact("alpha beta"))[0] == "[REDACTED] [REDACTED]"
+        finally:
+            engine.shutdown()
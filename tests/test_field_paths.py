@@ -0,0 +1,43 @@
+import pytest
+
+from src.field_paths import PROFILES, FieldSelector, field_selector, parse_field_path
+
+
+def test_parse_field_path():
+    assert parse_field_path("messages[*].content[0].text") == [
+        "messages", -1, "content", 0, "text"
+    ]
+    assert parse_field_path("input.*") == ["input", "*"]
+    for bad in ("", "a..b", "a[x]", "a["):
+        with pytest.raises(ValueError):
+            parse_field_path(bad)
+
+
+def test_field_selector_matches_exact_paths_and_wildcards():
+    select = FieldSelector(["messages[*].content", "meta.*.note", "input[1]"])
+    assert select(("messages", 3, "content"))
+    assert not select(("messages", 3, "role"))
+    assert not select(("messages", 3, "content", 0, "text"))
+    assert not select(("messages",))
+    assert select(("meta", "a", "note"))
+    assert select(("input", 1))
+    assert not select(("input", 0))
+
+
+def test_builtin_profiles():
+    openai = field_selector("openai")
+    assert openai(("messages", 0, "content"))
+    assert openai(("messages", 0, "content", 1, "text"))
+    assert not openai(("messages", 0, "content", 1, "image_url", "url"))
+    assert not openai(("model",))
+    assert not openai(("tools", 0, "function", "description"))
+
+    anthropic = field_selector("anthropic", ("metadata.user_id",))
+    assert anthropic(("system",))
+    assert anthropic(("messages", 0, "content", 2, "content"))
+    assert anthropic(("metadata", "user_id"))
+    assert not anthropic(("messages", 0, "content", 0, "source", "data"))
+
+    assert set(PROFILES) == {"openai", "anthropic"}
+    with pytest.raises(ValueError):
+        field_selector("unknown")
@@ -1,6 +1,11 @@
+import asyncio
+import gzip
+import json
 import pytest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, Mock, patch
 from mitmproxy.test import tflow
+from prometheus_client import REGISTRY
+from src.config import HostAdmissionPolicy, HostDLPPolicy, JSONFieldPolicy, config
 from src.proxy_core import DLPAddon
 
 
@@ -8,7 +13,7 @@ from src.proxy_core import DLPAddon
 async def test_dlp_addon_redaction_fail_closed():
     addon = DLPAddon()
     # Mock DLP Engine to fail
-    addon.dlp_engine.redact = AsyncMock(side_effect=Exception("DLP Crash"))
+    addon.dlp_engine.plan = AsyncMock(side_effect=Exception("DLP Crash"))
 
     f = tflow.tflow()
     f.request.method = "POST"
@@ -27,8 +32,8 @@ async def test_dlp_addon_redaction_fail_closed():
 @pytest.mark.asyncio
 async def test_dlp_addon_redaction_success():
     addon = DLPAddon()
-    # Mock DLP Engine to return redacted content
-    addon.dlp_engine.redact = AsyncMock(return_value=("redacted", {}))
+    # Mock DLP Engine to return a plan covering the whole content
+    addon.dlp_engine.plan = AsyncMock(return_value=([(0, 9, ("SECRET",))], {}))
 
     f = tflow.tflow()
     f.request.method = "POST"
@@ -37,5 +42,560 @@ async def test_dlp_addon_redaction_success():
 
     await addon.request(f)
 
-    assert f.request.text == "redacted"
+    assert f.request.text == "[REDACTED]"
     addon.dlp_engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_redacts_json_string_leaves():
+    addon = DLPAddon()
+    addon.dlp_engine.ml_enabled = False
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "application/json"
+    f.request.content = json.dumps(
+        {
+            "model": "gpt-4o",
+            "messages": [
+                {"role": "user", "content": "my password is hunter2"},
+                {"role": "user", "content": ["the secret", 42]},
+            ],
+        }
+    ).encode()
+
+    await addon.request(f)
+
+    data = json.loads(f.request.content)
+    assert data["model"] == "gpt-4o"
+    assert data["messages"][0]["content"] == "my [REDACTED] is hunter2"
+    assert data["messages"][1]["content"] == ["the [REDACTED]", 42]
+    addon.dlp_engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_patches_json_without_reserializing():
+    addon = DLPAddon()
+    addon.dlp_engine.ml_enabled = False
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "application/json"
+    body = b'{\n  "temperature": 1.0,\n  "content": "the secret \\u00e9",\n  "n": 1e2\n}'
+    f.request.content = body
+    await addon.request(f)
+    assert f.request.content == (
+        b'{\n  "temperature": 1.0,\n  "content": "the [REDACTED] \\u00e9",\n  "n": 1e2\n}'
+    )
+
+    clean = b'{"temperature":1.0,  "content":"hello"}'
+    f.request.content = clean
+    await addon.request(f)
+    assert f.request.content == clean
+    addon.dlp_engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_scans_invalid_json_as_text():
+    addon = DLPAddon()
+    addon.dlp_engine.detector = "patterns"
+
+    for body, expected in [
+        (
+            b'{"note": "hi"}\n4111 1111 1111 1111',
+            b'{"note": "hi"}\n[REDACTED]',
+        ),
+        (b"[1,2]\n415-555-0199", b"[1,2]\n[REDACTED]"),
+    ]:
+        f = tflow.tflow()
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "application/json"
+        f.request.content = body
+        await addon.request(f)
+        assert f.request.content == expected
+    addon.dlp_engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_patches_utf8_bytes_in_place():
+    addon = DLPAddon()
+    addon.dlp_engine.ml_enabled = False
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain; charset=utf-8"
+    f.request.content = "Grüße, das password ist €uro".encode("utf-8")
+
+    await addon.request(f)
+
+    assert f.request.content == "Grüße, das [REDACTED] ist €uro".encode("utf-8")
+    addon.dlp_engine.shutdown()
+
+
+def _get(path):
+    f = tflow.tflow()
+    f.request.method = "GET"
+    f.request.path = path
+    return f
+
+
+@pytest.mark.asyncio
+async def test_health_separates_liveness_and_readiness():
+    addon = DLPAddon()
+
+    live, ready, legacy = _get("/_health/live"), _get("/_health/ready"), _get("/_health")
+    for f in (live, ready, legacy):
+        await addon.request(f)
+    assert live.response.status_code == 200
+    assert ready.response.status_code == 503
+    assert legacy.response.status_code == 503
+
+    assert await addon._wait_until_ready()
+    ready = _get("/_health/ready")
+    await addon.request(ready)
+    assert ready.response.status_code == 200
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_blocks_bodies_until_engine_loads():
+    addon = DLPAddon()
+    addon.dlp_engine.load = Mock(side_effect=RuntimeError("model missing"))
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.content = b"my password"
+
+    await addon.request(f)
+
+    assert f.response.status_code == 503
+    assert f.response.headers["Retry-After"]
+    assert f.request.content == b"my password"
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_sheds_when_ml_queue_is_full():
+    addon = DLPAddon()
+    addon.dlp_engine.task_queue.full = Mock(return_value=True)
+    addon.dlp_engine.plan = AsyncMock(return_value=([], {}))
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.content = b"hello"
+
+    await addon.request(f)
+
+    assert f.response.status_code == 503
+    assert f.response.headers["Retry-After"] == "1"
+    assert b"dlp_overloaded" in f.response.content
+    addon.dlp_engine.plan.assert_not_called()
+    assert addon.admission.inflight == 0
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_applies_route_admission_policy():
+    policy = HostDLPPolicy(
+        admission=HostAdmissionPolicy(max_inflight=0, status_code=429, retry_after=9)
+    )
+    with patch.object(config.dlp, "hosts", {"*.example.com": policy}):
+        addon = DLPAddon()
+    addon.dlp_engine.plan = AsyncMock(return_value=([], {}))
+
+    f = tflow.tflow()
+    f.request.host = "eu.api.example.com"
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.content = b"hello"
+
+    await addon.request(f)
+
+    assert f.response.status_code == 429
+    assert f.response.headers["Retry-After"] == "9"
+    addon.dlp_engine.plan.assert_not_called()
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_tags_degraded_requests():
+    addon = DLPAddon()
+    assert await addon._wait_until_ready()
+
+    async def slow_analyze(text):
+        await asyncio.sleep(1)
+        return []
+
+    addon.dlp_engine._analyze = slow_analyze
+
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.content = b"write to jane@example.com today"
+
+    degraded = REGISTRY.get_sample_value("dlp_degraded_total", {"host": "other"}) or 0
+    with patch.multiple(config.dlp, latency_budget_ms=50, latency_policy="degrade"):
+        await addon.request(f)
+
+    assert f.response is None
+    assert f.request.text == "write to [REDACTED] today"
+    assert f.metadata["dlp_degraded"] is True
+    # Labelled by route, not by the (unconfigured) Host header
+    assert REGISTRY.get_sample_value(
+        "dlp_degraded_total", {"host": "other"}
+    ) == degraded + 1
+    assert REGISTRY.get_sample_value(
+        "dlp_degraded_total", {"host": f.request.host}
+    ) is None
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_selects_detector_per_host():
+    with patch.dict(
+        config.dlp.hosts, {"api.example.com": HostDLPPolicy(detector="patterns")}
+    ):
+        addon = DLPAddon()
+    assert await addon._wait_until_ready()
+    addon.dlp_engine._analyze = AsyncMock(return_value=[])
+
+    f = tflow.tflow()
+    f.request.host = "api.example.com"
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.content = b"card 4111 1111 1111 1111 for jane@example.com"
+    await addon.request(f)
+
+    assert f.request.text == "card [REDACTED] for [REDACTED]"
+    addon.dlp_engine._analyze.assert_not_called()
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_scans_only_policy_fields():
+
+    def flow(path):
+        f = tflow.tflow()
+        f.request.host = "api.openai.com"
+        f.request.path = path
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "application/json"
+        f.request.content = json.dumps(
+            {
+                "model": "secret-model",
+                "messages": [{"role": "user", "content": "the secret"}],
+            }
+        ).encode()
+        return f
+
+    policy = HostDLPPolicy(
+        json_fields=[JSONFieldPolicy(path_prefix="/v1/chat/", profile="openai")]
+    )
+    with patch.dict(config.dlp.hosts, {"api.openai.com": policy}):
+        addon = DLPAddon()
+    addon.dlp_engine.ml_enabled = False
+    chat, other = flow("/v1/chat/completions?x=1"), flow("/v1/other")
+    await addon.request(chat)
+    await addon.request(other)
+
+    data = json.loads(chat.request.content)
+    assert data["model"] == "secret-model"
+    assert data["messages"][0]["content"] == "the [REDACTED]"
+    assert json.loads(other.request.content)["model"] == "[REDACTED]-model"
+    addon.dlp_engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_routes_passthrough_and_limits():
+    routes = {
+        "*.telemetry.example.com": HostDLPPolicy(passthrough=True),
+        "api.example.com/upload/": HostDLPPolicy(max_body_size=10),
+    }
+    with patch.dict(config.dlp.hosts, routes):
+        addon = DLPAddon()
+    addon.dlp_engine.ml_enabled = False
+
+    def flow(host, path):
+        f = tflow.tflow(resp=True)
+        f.request.host = host
+        f.request.path = path
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "text/plain"
+        f.request.content = b"the secret is out"
+        return f
+
+    # Passthrough routes are streamed untouched, in both directions
+    telemetry = flow("eu.telemetry.example.com", "/v1/events")
+    await addon.requestheaders(telemetry)
+    assert telemetry.request.stream is True
+    await addon.request(telemetry)
+    assert telemetry.request.content == b"the secret is out"
+    telemetry.response.headers["Content-Type"] = "application/json"
+    addon.responseheaders(telemetry)
+    assert telemetry.response.stream is True
+
+    # Over the route's own size limit: streamed, or rejected when that's off
+    upload = flow("api.example.com", "/upload/file")
+    await addon.requestheaders(upload)
+    assert callable(upload.request.stream)
+    with patch.object(config.proxy, "stream_large_bodies", False):
+        upload = flow("api.example.com", "/upload/file")
+        upload.response = None
+        await addon.requestheaders(upload)
+        await addon.request(upload)
+    assert upload.response.status_code == 413
+
+    other = flow("api.example.com", "/chat")
+    await addon.requestheaders(other)
+    await addon.request(other)
+    assert other.request.content == b"the [REDACTED] is out"
+    addon.dlp_engine.shutdown()
+
+
+def test_dlp_addon_scans_streamed_responses():
+    addon = DLPAddon()
+    f = tflow.tflow(resp=True)
+    f.response.headers["Content-Type"] = "text/event-stream"
+    del f.response.headers["Content-Length"]
+    addon.responseheaders(f)
+
+    stream = f.response.stream
+    chunks = [b'data: {"delta": "mail jane@exa', b'mple.com"}\n\n', b""]
+    out = b"".join(b"".join(stream(chunk)) for chunk in chunks)
+    assert out == b'data: {"delta": "mail [REDACTED]"}\n\n'
+
+    # One token per event: the entity is matched across events
+    split = tflow.tflow(resp=True)
+    split.response.headers["Content-Type"] = "text/event-stream; charset=utf-8"
+    del split.response.headers["Content-Length"]
+    addon.responseheaders(split)
+    events = [
+        b'data: {"type": "content_block_delta", "delta": {"text": "mail jane"}}\n\n',
+        b'data: {"type": "content_block_delta", "delta": {"text": "@example.com"}}\n\n',
+        b"",
+    ]
+    out = b"".join(b"".join(split.response.stream(event)) for event in events)
+    assert out == (
+        b'data: {"type": "content_block_delta", "delta": {"text": "mail [REDACTED]"}}\n\n'
+        b'data: {"type": "content_block_delta", "delta": {"text": ""}}\n\n'
+    )
+
+    buffered = tflow.tflow(resp=True)
+    buffered.response.headers["Content-Type"] = "application/json"
+    addon.responseheaders(buffered)
+    assert not buffered.response.stream
+
+    unsupported = tflow.tflow(resp=True)
+    unsupported.response.headers["Content-Type"] = "text/event-stream"
+    unsupported.response.headers["Content-Encoding"] = "compress"
+    addon.responseheaders(unsupported)
+    assert not unsupported.response.stream
+    addon.done()
+
+
+def test_dlp_addon_scans_compressed_streams():
+    addon = DLPAddon()
+    f = tflow.tflow(resp=True)
+    f.response.headers["Content-Type"] = "text/event-stream"
+    f.response.headers["Content-Encoding"] = "gzip"
+    addon.responseheaders(f)
+    assert "Content-Length" not in f.response.headers
+    assert f.response.headers["Transfer-Encoding"] == "chunked"
+
+    body = gzip.compress(b'data: {"delta": "mail jane@example.com"}\n\n')
+    stream = f.response.stream
+    out = b"".join(
+        b"".join(stream(body[i:i + 7])) for i in range(0, len(body), 7)
+    ) + b"".join(stream(b""))
+    assert gzip.decompress(out) == b'data: {"delta": "mail [REDACTED]"}\n\n'
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_rejects_decompression_bombs():
+    addon = DLPAddon()
+    f = tflow.tflow()
+    f.request.method = "POST"
+    f.request.headers["Content-Type"] = "text/plain"
+    f.request.headers["Content-Encoding"] = "gzip"
+    f.request.raw_content = gzip.compress(b"a" * (4 * 1024 * 1024))
+
+    with patch.object(config.proxy, "max_body_size", 64 * 1024 * 1024):
+        await addon.request(f)
+    assert f.response.status_code == 413
+
+    f.response = None
+    f.request.raw_content = b"not gzip"
+    await addon.request(f)
+    assert f.response.status_code == 400
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_buffers_chunked_uploads_unless_told_to_stream():
+    routes = {
+        "api.example.com": HostDLPPolicy(
+            json_fields=[JSONFieldPolicy(profile="openai")]
+        )
+    }
+    with patch.dict(config.dlp.hosts, routes):
+        addon = DLPAddon()
+    assert await addon._wait_until_ready()
+    body = b'{"model": "secret-model", "prompt": "the secret is 415-555-0199"}'
+
+    def chunked():
+        f = tflow.tflow()
+        f.request.host = "api.example.com"
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "application/json"
+        del f.request.headers["Content-Length"]
+        f.request.headers["Transfer-Encoding"] = "chunked"
+        return f
+
+    # Its size is unknown at header time, so it's buffered and gets the
+    # route's full analysis (here: only the selected field)
+    with patch.object(config.proxy, "max_body_size", 100):
+        f = chunked()
+        await addon.requestheaders(f)
+        assert not f.request.stream
+        f.request.content = body
+        await addon.request(f)
+        assert f.request.content == (
+            b'{"model": "secret-model", "prompt": "the [REDACTED] is [REDACTED]"}'
+        )
+
+        # Still limited to max_body_size once buffered
+        f = chunked()
+        await addon.requestheaders(f)
+        f.request.content = body * 2
+        await addon.request(f)
+        assert f.response.status_code == 413
+
+        # Opting in streams it with static terms and patterns only
+        with patch.object(config.proxy, "stream_unknown_length", True):
+            f = chunked()
+            await addon.requestheaders(f)
+        out = b"".join(f.request.stream(body)) + b"".join(f.request.stream(b""))
+        assert out == (
+            b'{"model": "[REDACTED]-model", "prompt": "the [REDACTED] is [REDACTED]"}'
+        )
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_gates_streamed_uploads_on_readiness_and_admission():
+    addon = DLPAddon()
+    addon.dlp_engine.load = Mock(side_effect=RuntimeError("model missing"))
+
+    def upload():
+        f = tflow.tflow()
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "text/plain"
+        f.request.headers["Content-Length"] = "1000"
+        return f
+
+    with patch.object(config.proxy, "max_body_size", 100):
+        # Not ready: static terms aren't loaded, so nothing may stream out
+        early = upload()
+        with patch.object(config.proxy, "startup_timeout", 0.1):
+            await addon.requestheaders(early)
+        assert not early.request.stream
+        assert early.response.status_code == 503
+        assert early.response.headers["Retry-After"]
+        response = early.response
+        await addon.request(early)
+        assert early.response is response
+
+        addon.ready = True
+        with patch.object(addon.admission.config, "max_inflight", 1):
+            first = upload()
+            await addon.requestheaders(first)
+            assert callable(first.request.stream)
+            assert addon.admission.inflight == 1
+
+            shed = upload()
+            await addon.requestheaders(shed)
+            assert not shed.request.stream
+            assert shed.response.status_code == 503
+            assert b"dlp_overloaded" in shed.response.content
+
+            # The slot is given back when the upload completes or fails
+            addon.error(first)
+            assert addon.admission.inflight == 0
+            second = upload()
+            await addon.requestheaders(second)
+            assert addon.admission.inflight == 1
+            second.request.content = None
+            await addon.request(second)
+            assert addon.admission.inflight == 0
+    addon.done()
+
+
+@pytest.mark.asyncio
+async def test_dlp_addon_streams_bodies_over_the_size_limit():
+    addon = DLPAddon()
+    body = b"x" * 64 + b" call 415-555-0199 " + b"y" * 64
+
+    with patch.object(config.proxy, "max_body_size", 100):
+        small = tflow.tflow()
+        small.request.method = "POST"
+        small.request.headers["Content-Type"] = "text/plain"
+        small.request.headers["Content-Length"] = "50"
+        await addon.requestheaders(small)
+        assert not small.request.stream
+
+        f = tflow.tflow()
+        f.request.method = "POST"
+        f.request.headers["Content-Type"] = "text/plain"
+        f.request.headers["Content-Length"] = str(len(body))
+        await addon.requestheaders(f)
+
+        stream = f.request.stream
+        out = b"".join(b"".join(stream(body[i:i + 10])) for i in range(0, len(body), 10))
+        out += b"".join(stream(b""))
+        # Masked in place, so the Content-Length sent ahead still holds
+        assert out == b"x" * 64 + b" call [REDACTED]** " + b"y" * 64
+
+        # The request hook runs after the body has streamed through
+        f.request.content = None
+        await addon.request(f)
+        assert f.response is None
+
+        # Compressed uploads are decoded, scanned and recompressed, switching
+        # to chunked framing since the new length isn't known ahead
+        gz = tflow.tflow()
+        gz.request.method = "POST"
+        gz.request.headers["Content-Type"] = "text/plain"
+        gz.request.headers["Content-Encoding"] = "gzip"
+        gz.request.headers["Content-Length"] = "1000"
+        await addon.requestheaders(gz)
+        assert "Content-Length" not in gz.request.headers
+        assert gz.request.headers["Transfer-Encoding"] == "chunked"
+        out = b"".join(gz.request.stream(gzip.compress(body)))
+        out += b"".join(gz.request.stream(b""))
+        assert gzip.decompress(out) == b"x" * 64 + b" call [REDACTED] " + b"y" * 64
+
+        # An upload cut short by the decompression ratio limit is killed
+        # rather than answered with the upstream's response
+        bomb = tflow.tflow(resp=True)
+        bomb.request.method = "POST"
+        bomb.request.headers["Content-Type"] = "text/plain"
+        bomb.request.headers["Content-Encoding"] = "gzip"
+        bomb.request.headers["Content-Length"] = "1000"
+        await addon.requestheaders(bomb)
+        bomb.request.stream(gzip.compress(b"a" * 8 * 1024 * 1024))
+        addon.responseheaders(bomb)
+        assert bomb.error and bomb.error.msg == "Connection killed."
+
+        with patch.object(config.proxy, "stream_large_bodies", False):
+            rejected = tflow.tflow()
+            rejected.request.method = "POST"
+            rejected.request.headers["Content-Type"] = "text/plain"
+            rejected.request.content = body
+            await addon.requestheaders(rejected)
+            assert not rejected.request.stream
+            await addon.request(rejected)
+            assert rejected.response.status_code == 413
+    addon.done()
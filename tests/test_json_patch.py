@@ -0,0 +1,75 @@
+from src.field_paths import FieldSelector
+from src.json_patch import redaction_edits, string_values
+from src.redaction import apply_edits, build_plan
+
+
+def test_string_values_skips_keys_and_decodes_escapes():
+    text = '{"a": "plain", "b": [1, -2.5e3, true, null, "x\\"y\\u00e9"], "c": {"d": "e"}}'
+    values = string_values(text)
+    assert [v.value for v in values] == ["plain", 'x"yé', "e"]
+    assert [v.escaped for v in values] == [False, True, False]
+    for v in values:
+        assert text[v.start] == text[v.end - 1] == '"'
+
+
+def test_string_values_rejects_non_json():
+    assert string_values("my password is hunter2") is None
+    assert string_values('{"a": "b"} trailing words') is None
+    assert string_values('{"a": "bad \\x escape"}') is None
+    assert string_values("[1, 2, 3]") == []
+
+
+def test_string_values_rejects_invalid_structure():
+    # Text outside the strings would never be scanned if these passed as JSON
+    for text in [
+        '{"note": "hi"}\n4111 1111 1111 1111',
+        "[1,2]\n415-555-0199",
+        '{"a": 1}{"b": 2}',
+        '["a" "b"]',
+        '{"a" "b"}',
+        "[1 2]",
+        "[1, 2, 3 4]",
+        '{"a": 1]',
+        '{"a": [1}',
+        "[1, 2,]",
+        '{"a": 1,}',
+        '{"a": }',
+        '{"a": tru}',
+        '{"a": nullnull}',
+        '{"a": truex}',
+        '{"a": 0123}',
+        "",
+    ]:
+        assert string_values(text) is None, text
+    assert string_values('  "solo"\n').pop().value == "solo"
+    assert string_values("[0.5, -1e3, true, false, null, {}, []]") == []
+
+
+def test_redaction_edits_patch_in_place_and_keep_formatting():
+    text = '{\n  "n": 1.50,\n  "msg": "call John now",\n  "ok": "fine"\n}'
+    values = string_values(text)
+    plans = [build_plan([(5, 9, "PERSON")]), []]
+    edits = redaction_edits(text, values, plans, "[X]")
+    assert apply_edits(text, edits) == (
+        '{\n  "n": 1.50,\n  "msg": "call [X] now",\n  "ok": "fine"\n}'
+    )
+    assert redaction_edits(text, values, [[] for _ in values], "[X]") == []
+
+
+def test_redaction_edits_reencode_escaped_strings():
+    text = '["caf\\u00e9 John\\n"]'
+    values = string_values(text)
+    edits = redaction_edits(text, values, [build_plan([(5, 9, "PERSON")])], "[X]")
+    assert apply_edits(text, edits) == '["caf\\u00e9 [X]\\n"]'
+
+
+def test_string_values_with_selector_tracks_paths():
+    text = (
+        '{"model": "m", "messages": [{"role": "user", "content": "hi"},'
+        ' {"role": "user", "content": [{"type": "text", "text": "a\\u00e9"},'
+        ' {"type": "image_url", "image_url": {"url": "data:..."}}]}], "n": [1, [2]]}'
+    )
+    select = FieldSelector(["messages[*].content", "messages[*].content[*].text"])
+    values = string_values(text, select)
+    assert [v.value for v in values] == ["hi", "aé"]
+    assert string_values('{"a": [}', select) is None
@@ -2,6 +2,7 @@ import pytest
 import asyncio
 import time
 from unittest.mock import MagicMock, patch
+from src.config import AdmissionConfig
 from src.proxy_core import DLPAddon
 
 
@@ -10,6 +11,12 @@ from src.proxy_core import DLPAddon
 def mock_config():
     with patch("src.proxy_core.config") as mock:
         mock.get.return_value = 9090  # metrics port
+        mock.proxy.startup_timeout = 5
+        mock.proxy.max_body_size = 10 * 1024 * 1024
+        mock.dlp.warmup_enabled = False
+        mock.dlp.latency_budget_ms = 0
+        mock.dlp.hosts = {}
+        mock.proxy.admission = AdmissionConfig()
         yield mock
 
 
@@ -19,11 +26,12 @@ def mock_dlp_engine():
         engine_instance = MockEngine.return_value
 
         # Simulate a slow async operation
-        async def slow_redact(text):
+        async def slow_plan(text):
             await asyncio.sleep(0.1)  # Async sleep
-            return text, {}
+            return [], {}
 
-        engine_instance.redact = slow_redact
+        engine_instance.plan = slow_plan
+        engine_instance.task_queue.full.return_value = False
         yield engine_instance
 
 
@@ -39,7 +47,9 @@ async def test_async_concurrency(mock_config, mock_dlp_engine):
     def create_flow():
         flow = MagicMock()
         flow.request.method = "POST"
-        flow.request.content = b"test content"
+        flow.request.stream = False
+        flow.metadata = {}
+        flow.request.content = flow.request.raw_content = b"test content"
         flow.request.get_text.return_value = "test content"
         flow.request.headers = {"Content-Type": "text/plain"}
         flow.request.pretty_url = "http://example.com"
@@ -76,9 +86,13 @@ async def test_request_buffering_limit(mock_config, mock_dlp_engine):
 
     flow = MagicMock()
     flow.request.method = "POST"
+    flow.request.stream = False
+    flow.metadata = {}
     # Create content > 10MB
-    flow.request.content = b"x" * (10 * 1024 * 1024 + 1)
+    flow.request.content = flow.request.raw_content = b"x" * (10 * 1024 * 1024 + 1)
     flow.request.headers = {"Content-Type": "text/plain"}
+    flow.request.host = "example.com"
+    flow.request.path = "/"
 
     await addon.request(flow)
 
@@ -0,0 +1,74 @@
+import pytest
+from src.matchers import (
+    AhoCorasickMatcher,
+    FlashTextMatcher,
+    MarisaMatcher,
+    build_matcher,
+    compile_term_index,
+    parse_term,
+)
+
+
+def test_parse_term_flags():
+    assert parse_term("secret") == ("secret", True, False)
+    assert parse_term("(?s)ABCsecret") == ("ABCsecret", False, False)
+    assert parse_term("(?wc)ProjectX", whole_word=False) == ("ProjectX", True, True)
+    assert parse_term("(?i)token", case_sensitive=True) == ("token", True, False)
+
+
+@pytest.mark.parametrize("backend", ["flashtext", "aho_corasick"])
+def test_whole_word_case_insensitive(backend):
+    matcher = build_matcher(backend, ["password", "api key"])
+    text = "My PASSWORD and api key, not passwords."
+    assert matcher.find(text) == [(3, 11, "password"), (16, 23, "api key")]
+
+
+def test_aho_corasick_substring_and_case_modes():
+    matcher = build_matcher(
+        "aho_corasick", ["(?s)ABCsecret", "(?c)ProjectX", "internal"]
+    )
+    text = "key=ABCSECRET123 projectx ProjectX https://internal.example.com"
+    assert matcher.find(text) == [
+        (4, 13, "ABCsecret"),
+        (26, 34, "ProjectX"),
+        (43, 51, "internal"),
+    ]
+
+
+def test_aho_corasick_prefers_leftmost_longest():
+    matcher = AhoCorasickMatcher(
+        [parse_term("(?s)secret"), parse_term("(?s)secret123"), parse_term("(?s)t12")]
+    )
+    assert matcher.find("xsecret123x") == [(1, 10, "secret123")]
+
+
+def test_matchers_agree_on_whole_word_terms():
+    lines = ["alpha", "beta gamma", "delta_1", "Ünïcode"]
+    text = "alpha, BETA GAMMA; delta_1 delta_12 ünïcode alphabet"
+    flashtext = FlashTextMatcher([parse_term(line) for line in lines])
+    assert build_matcher("aho_corasick", lines).find(text) == flashtext.find(text)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_matcher("grep", [])
+
+
+def test_marisa_index_round_trip(tmp_path):
+    path = str(tmp_path / "terms.idx")
+    count = compile_term_index(["password", "(?s)ABCsecret", "(?c)ProjectX"], path)
+    assert count == 3
+
+    matcher = MarisaMatcher.load(path)
+    text = "my Password: key=abcsecret123 projectx ProjectX"
+    assert matcher.find(text) == [
+        (3, 11, "Password"),
+        (17, 26, "abcsecret"),
+        (39, 47, "ProjectX"),
+    ]
+    aho = build_matcher("aho_corasick", ["password", "(?s)ABCsecret", "(?c)ProjectX"])
+    assert [h[:2] for h in matcher.find(text)] == [h[:2] for h in aho.find(text)]
+
+
+def test_marisa_empty_index():
+    assert MarisaMatcher([]).find("anything") == []
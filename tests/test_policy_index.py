@@ -0,0 +1,51 @@
+import pytest
+
+from src.config import HostDLPPolicy, JSONFieldPolicy
+from src.policy_index import PolicyIndex, parse_route_key
+
+
+def test_parse_route_key():
+    assert parse_route_key("API.Example.com.") == ("api.example.com", False, "")
+    assert parse_route_key("*.example.com/v1/") == ("example.com", True, "/v1/")
+    assert parse_route_key("*") == ("", True, "")
+    for bad in ("", "/v1", "api.*.com", "a*.example.com"):
+        with pytest.raises(ValueError):
+            parse_route_key(bad)
+
+
+def test_lookup_prefers_the_most_specific_host_then_path():
+    index = PolicyIndex(
+        {
+            key: HostDLPPolicy()
+            for key in (
+                "*",
+                "*.example.com",
+                "*.api.example.com",
+                "api.example.com/v1/",
+                "api.example.com/v1/chat/",
+                "llm.example.com",
+            )
+        }
+    )
+
+    def key(host, path="/"):
+        route = index.lookup(host, path)
+        return route and route.key
+
+    assert key("api.example.com", "/v1/chat/completions?stream=1") == (
+        "api.example.com/v1/chat/"
+    )
+    assert key("API.example.com", "/v1/embeddings") == "api.example.com/v1/"
+    # No matching path for the exact host: fall back to the wildcards
+    assert key("api.example.com", "/v2/") == "*.example.com"
+    assert key("eu.api.example.com") == "*.api.example.com"
+    assert key("llm.example.com", "/anything") == "llm.example.com"
+    assert key("example.com") == "*"
+    assert key("registry.npmjs.org") == "*"
+    assert PolicyIndex({}).lookup("example.com", "/") is None
+
+
+def test_invalid_field_policy_fails_at_build():
+    policy = HostDLPPolicy(json_fields=[JSONFieldPolicy(profile="nope")])
+    with pytest.raises(ValueError):
+        PolicyIndex({"api.example.com": policy})
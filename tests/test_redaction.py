@@ -0,0 +1,33 @@
+from src.redaction import apply_edits_to_bytes, apply_plan, build_plan, redacted_length
+
+
+def test_build_plan_merges_overlapping_spans():
+    spans = [(10, 15, "PERSON"), (0, 4, "STATIC_TERM"), (12, 20, "LOCATION"), (20, 22, "PERSON")]
+    assert build_plan(spans) == [
+        (0, 4, ("STATIC_TERM",)),
+        (10, 22, ("PERSON", "LOCATION")),
+    ]
+
+
+def test_apply_plan_single_pass():
+    text = "call John at 555"
+    plan = build_plan([(5, 9, "PERSON"), (13, 16, "PHONE")])
+    redacted = apply_plan(text, plan, "[X]")
+    assert redacted == "call [X] at [X]"
+    assert redacted_length(len(text), plan, "[X]") == len(redacted)
+    assert apply_plan(text, [], "[X]") is text
+
+
+def test_apply_edits_to_bytes_utf8():
+    text = "Grüße John, €5"
+    patched = apply_edits_to_bytes(text.encode("utf-8"), text, [(6, 10, "[X]")], "utf-8")
+    assert patched == "Grüße [X], €5".encode("utf-8")
+
+
+def test_apply_edits_to_bytes_single_byte_and_unsupported():
+    text = "café secret"
+    raw = text.encode("latin-1")
+    edits = [(5, 11, "[X]")]
+    assert apply_edits_to_bytes(raw, text, edits, "latin-1") == "café [X]".encode("latin-1")
+    assert apply_edits_to_bytes(raw, text, edits, "utf-16") is None
+    assert apply_edits_to_bytes(raw, text, [(5, 11, "€")], "latin-1") is None
@@ -0,0 +1,153 @@
+import json
+
+from src.matchers import build_matcher
+from src.patterns import PatternEngine
+from src.streaming import SSERedactor, StreamRedactor
+
+TOKEN = "[REDACTED]"
+
+
+def make_find():
+    matcher = build_matcher("flashtext", ["project titan"])
+    patterns = PatternEngine()
+
+    def find(text):
+        spans = [(s, e, "STATIC_TERM") for s, e, _ in matcher.find(text)]
+        return spans + patterns.find(text)
+
+    return find
+
+
+def make_redactor(carry_chars=32, preserve_length=False):
+    return StreamRedactor(make_find(), TOKEN, carry_chars, preserve_length)
+
+
+def feed(redactor, data):
+    return b"".join(redactor(data))
+
+
+def stream(redactor, chunks):
+    return b"".join(feed(redactor, chunk) for chunk in chunks + [b""])
+
+
+def test_entities_split_across_chunks_are_redacted():
+    body = (
+        b"data: {\"delta\": \"Sure, write to jane.doe@example.com about "
+        b"Project Titan today, or call 415-555-0199.\"}\n\n"
+    )
+    expected = body.replace(b"jane.doe@example.com", TOKEN.encode())
+    expected = expected.replace(b"Project Titan", TOKEN.encode())
+    expected = expected.replace(b"415-555-0199", TOKEN.encode())
+    # Every split point, including ones inside each entity
+    for size in (1, 3, 7, 16, 50):
+        redactor = make_redactor()
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        assert stream(redactor, chunks) == expected
+        assert redactor.pii_types == {
+            "EMAIL_ADDRESS": 1,
+            "STATIC_TERM": 1,
+            "PHONE_NUMBER": 1,
+        }
+
+
+def test_holds_back_only_the_carry_window():
+    redactor = make_redactor(carry_chars=16)
+    first = feed(redactor, b"a" * 10 + b" " + b"b" * 40 + b" tail of the chunk")
+    # Released up to the last whitespace before the window
+    assert first == b"a" * 10 + b" " + b"b" * 40 + b" "
+    assert feed(redactor, b"") == b"tail of the chunk"
+
+
+def test_nothing_to_release_sends_no_chunk():
+    # An empty chunk would terminate a chunked HTTP/1 body
+    assert make_redactor()(b"short") == []
+
+
+def test_match_reaching_into_the_window_is_held_back_whole():
+    redactor = make_redactor(carry_chars=4)
+    assert feed(redactor, b"mail:jane@example.com") == b"mail:"
+    assert feed(redactor, b".au now") == TOKEN.encode()
+    assert feed(redactor, b"") == b" now"
+
+
+def test_multibyte_characters_split_across_chunks():
+    body = "Caffè per José: jane@example.com ✓".encode()
+    redactor = make_redactor()
+    chunks = [body[i:i + 1] for i in range(len(body))]
+    assert stream(redactor, chunks) == (
+        "Caffè per José: [REDACTED] ✓".encode()
+    )
+
+
+def test_preserve_length_masks_in_place():
+    body = "From José: jane@example.com, card 4111 1111 1111 1111, ok é".encode()
+    redactor = make_redactor(preserve_length=True)
+    chunks = [body[i:i + 5] for i in range(0, len(body), 5)]
+    out = stream(redactor, chunks)
+    assert len(out) == len(body)
+    assert out == "From José: [REDACTED]******, card [REDACTED]*********, ok é".encode()
+
+
+def sse(*deltas, **fields):
+    return b"".join(
+        b"data: "
+        + json.dumps({"id": "c1", "choices": [{"delta": {"content": d}}], **fields})
+        .encode()
+        + b"\n\n"
+        for d in deltas
+    )
+
+
+def contents(body):
+    return [
+        json.loads(line[len("data: "):])["choices"][0]["delta"]["content"]
+        for line in body.decode().split("\n\n")
+        if line.startswith("data: {")
+    ]
+
+
+def test_sse_entity_split_across_events_is_redacted():
+    body = sse("Mail jane", ".doe@example", ".com or call 415", "-555-0199 now")
+    body += b"data: [DONE]\n\n"
+    for size in (1, 9, len(body)):
+        redactor = SSERedactor(make_find(), TOKEN, carry_chars=32)
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        out = stream(redactor, chunks)
+        # The token lands in the event where the match starts
+        assert contents(out) == ["Mail [REDACTED]", "", " or call [REDACTED]", " now"]
+        assert out.endswith(b"data: [DONE]\n\n")
+        assert redactor.pii_types == {"EMAIL_ADDRESS": 1, "PHONE_NUMBER": 1}
+
+
+def test_sse_events_are_held_whole_and_in_order():
+    redactor = SSERedactor(make_find(), TOKEN, carry_chars=8)
+    first = feed(redactor, sse("the plan ", "is on schedule and fine"))
+    # The first event is released once enough text follows it
+    assert contents(first) == ["the plan "]
+    assert feed(redactor, sse(" today")) == b""
+    rest = feed(redactor, b"")
+    assert contents(rest) == ["is on schedule and fine", " today"]
+
+
+def test_sse_other_fields_and_plain_data_are_scanned():
+    redactor = SSERedactor(make_find(), TOKEN, carry_chars=8)
+    body = sse("hi", user="jane@example.com")
+    body += b"event: note\r\ndata: call 415-555-0199\r\n\r\n"
+    out = stream(redactor, [body])
+    assert b"jane@example.com" not in out
+    assert out.endswith(b"event: note\r\ndata: call [REDACTED]\r\n\r\n")
+    assert contents(out) == ["hi"]
+
+
+def test_sse_escaped_text_is_reencoded():
+    redactor = SSERedactor(make_find(), TOKEN, carry_chars=8)
+    out = stream(redactor, [sse('Jos\u00e9 "quoted" jane@', "example.com\n")])
+    assert contents(out) == ['Jos\u00e9 "quoted" [REDACTED]', "\n"]
+
+
+def test_body_that_never_ends_an_event_falls_back_to_raw_scanning(monkeypatch):
+    monkeypatch.setattr("src.streaming.MAX_HELD_EVENT_CHARS", 64)
+    redactor = SSERedactor(make_find(), TOKEN, carry_chars=8)
+    body = b"x" * 80 + b" mail jane@example.com and more text"
+    out = stream(redactor, [body[:90], body[90:]])
+    assert out == b"x" * 80 + b" mail [REDACTED] and more text"
@@ -51,3 +51,68 @@ def test_vault_provider_exception():
         terms = provider.get_terms()
 
         assert terms == []
+
+
+def _secret(version, terms):
+    return {"data": {"data": {"terms": terms}, "metadata": {"version": version}}}
+
+
+def test_vault_provider_skips_fetch_when_version_unchanged():
+    with patch("src.dlp_engine.hvac.Client") as MockClient:
+        kv = MockClient.return_value.secrets.kv.v2
+        MockClient.return_value.is_authenticated.return_value = True
+        kv.read_secret_version.return_value = _secret(1, ["secret1"])
+        kv.read_secret_metadata.return_value = {"data": {"current_version": 1}}
+
+        provider = VaultTermProvider(
+            url="http://localhost:8200", token="token", path="secret/data"
+        )
+        assert provider.get_terms_if_changed() == ["secret1"]
+        assert provider.get_terms_if_changed() is None
+        assert kv.read_secret_version.call_count == 1
+
+        kv.read_secret_version.return_value = _secret(2, ["secret2"])
+        kv.read_secret_metadata.return_value = {"data": {"current_version": 2}}
+        assert provider.get_terms_if_changed() == ["secret2"]
+        # One client for the lifetime of the provider
+        assert MockClient.call_count == 1
+
+
+def test_vault_provider_snapshot_on_cold_start(tmp_path):
+    snapshot = tmp_path / "vault_terms.json"
+    with patch("src.dlp_engine.hvac.Client") as MockClient:
+        kv = MockClient.return_value.secrets.kv.v2
+        MockClient.return_value.is_authenticated.return_value = True
+        kv.read_secret_version.return_value = _secret(3, ["secret1", "secret2"])
+
+        VaultTermProvider(
+            url="http://localhost:8200",
+            token="token",
+            path="secret/data",
+            snapshot_file=str(snapshot),
+        ).get_terms()
+        assert oct(snapshot.stat().st_mode & 0o777) == "0o600"
+
+        # Vault is down when the next process starts
+        kv.read_secret_version.side_effect = Exception("Vault error")
+        provider = VaultTermProvider(
+            url="http://localhost:8200",
+            token="token",
+            path="secret/data",
+            snapshot_file=str(snapshot),
+        )
+        assert provider.get_terms_if_changed() == ["secret1", "secret2"]
+
+
+def test_vault_provider_backoff_grows_with_failures():
+    with patch("src.dlp_engine.hvac.Client") as MockClient:
+        MockClient.return_value.is_authenticated.return_value = False
+        provider = VaultTermProvider(
+            url="http://localhost:8200", token="token", path="secret/data"
+        )
+        assert 54 <= provider.next_poll_delay(60) <= 66
+
+        provider.get_terms()
+        provider.get_terms()
+        assert 216 <= provider.next_poll_delay(60) <= 264
+        assert provider.next_poll_delay(60, max_backoff=100) <= 110